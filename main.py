@@ -2,17 +2,71 @@ import os
 import random
 import argparse
 import subprocess
+import asyncio
 from tqdm import tqdm
-import shlex
+import json
+import re
+import sqlite3
+import select
+import struct
+import ctypes
+import ctypes.util
+import time
+import sys
+import atexit
+import signal
+import threading
+import math
+import bisect
+import shutil
+import tempfile
+from functools import lru_cache
+from array import array
+from itertools import islice, count
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, CancelledError, wait, FIRST_COMPLETED
 from datetime import datetime, date, timedelta
 
 # Define directories
 INPUT_DIR = r"/Volumes/video/Ford F150 Lightning Dashcam"
 OUTPUT_DIR = "output"
 OUTPUT_FILENAME = r"compiled-video.mp4"
+CATALOG_PATH = "catalog.sqlite"
 
 # Constants
 CLIP_DURATION_RANGE = (3, 5)  # Range for individual clip durations (min, max) in seconds
+SCAN_WORKERS = 8  # Number of directories listed concurrently while scanning
+DIRECTORY_MTIME_GRACE = 2  # Directories modified this recently (seconds) are re-listed on the next scan
+DIRECTORY_RESTAT_WINDOW = 24 * 60 * 60  # Files in directories modified this recently (seconds) are stat'ed again on incremental scans
+PROBE_WORKERS = 4  # Number of files probed concurrently
+INDEX_RESCAN_INTERVAL = 300  # Seconds between safety rescans while running the indexer
+PROBE_CACHE_MAX_ENTRIES = 200_000  # Least recently used probe results beyond this are evicted
+MAX_PROCESSES = 8  # Maximum number of FFmpeg/FFprobe processes running at once
+EXTRACT_WORKERS = 1  # Number of clips extracted concurrently
+LOCALITY_WINDOW = 32  # Candidates drawn ahead so extractions can run in on-disk order (1 runs them in draw order)
+BUDGET_TOLERANCE = 0.5  # Seconds the output may fall short of the target rather than adding a tinier final clip
+HEDGE_PERCENTILE = 95  # Extractions slower than this percentile of the run so far get a hedge (0 disables hedging)
+HEDGE_MIN_SAMPLES = 5  # Finished extractions needed before hedging starts
+STREAMING_SAMPLE_FACTOR = 2  # Candidates sampled per estimated clip with --streaming, leaving spares for skipped files
+SEGMENT_SEEK_LEAD = 0.5  # Seconds before a later segment's start where its output begins reading
+PROBE_TIMEOUT = 120  # Seconds before an FFprobe call is killed
+EXTRACT_TIMEOUT = 600  # Seconds before a clip extraction is killed
+STDERR_LIMIT = 64 * 1024  # Bytes of stderr kept per command (the tail, where errors are)
+SCRATCH_DIR = None  # Where the per-run scratch workspace is created (None: the system temp directory, 'memfd': in memory)
+SCRATCH_BUDGET = 2 * 1024 ** 3  # Bytes of temporary files allowed in the scratch workspace
+PREFETCH_AHEAD = 0  # Planned clips whose source data is staged locally ahead of extraction with --pipe-concat (0 disables)
+PREFETCH_BUDGET = 512 * 1024 ** 2  # Bytes of staged source data held at once
+PREFETCH_WORKERS = 2  # Number of clips staged concurrently
+PREFETCH_MARGIN = 1.0  # Seconds of media staged around each clip and at the start of the file
+
+# Patterns matched against directory paths (relative to the input directory, using '/')
+# to recognise date-partitioned folders. Named groups year/month/day give the dates a
+# folder covers, so whole subtrees outside the --start-date/--end-date range are skipped.
+DIRECTORY_DATE_PATTERNS = [
+    r'(?:.*/)?(?P<year>\d{4})-?(?P<month>\d{2})-?(?P<day>\d{2})',  # .../2025-05-12 or .../20250512
+    r'(?:.*/)?(?P<year>\d{4})-(?P<month>\d{2})',  # .../2025-05
+    r'(?:.*/)?(?P<year>(?:19|20)\d{2})(?:/(?P<month>\d{2})(?:/(?P<day>\d{2}))?)?',  # .../2025, .../2025/05, .../2025/05/12
+]
 
 def get_user_input(prompt, default=None, validator=None):
     """Get user input with optional default value and validation."""
@@ -56,109 +110,1894 @@ def validate_directory(value):
         raise ValueError("Directory does not exist")
     return value
 
-def get_mp4_files(directory):
-    """Recursively scan the directory and return a list of MP4 file paths."""
-    mp4_files = []
-    for root, _, files in os.walk(directory):
-        for f in files:
-            if f.lower().endswith('.mp4'):
-                filepath = os.path.join(root, f)
-                mp4_files.append(filepath)
+def get_directory_date_range(relative_path, patterns=DIRECTORY_DATE_PATTERNS):
+    """Return the (first, last) dates a directory covers according to its name.
+    
+    Returns None if the path doesn't match any of the date patterns.
+    """
+    normalized = relative_path.replace(os.sep, '/')
+    for pattern in patterns:
+        match = re.fullmatch(pattern, normalized)
+        if not match:
+            continue
+        
+        groups = match.groupdict()
+        try:
+            year = int(groups['year'])
+            if groups.get('month') and groups.get('day'):
+                first = last = date(year, int(groups['month']), int(groups['day']))
+            elif groups.get('month'):
+                first = date(year, int(groups['month']), 1)
+                next_month = first.replace(year=year + 1, month=1) if first.month == 12 else first.replace(month=first.month + 1)
+                last = next_month - timedelta(days=1)
+            else:
+                first, last = date(year, 1, 1), date(year, 12, 31)
+        except (KeyError, TypeError, ValueError):
+            # Not actually a date (e.g. month 13), try the next pattern
+            continue
+        return first, last
+    return None
+
+def make_directory_pruner(directory, start_date=None, end_date=None, patterns=DIRECTORY_DATE_PATTERNS):
+    """Build a predicate telling whether a subdirectory lies entirely outside the date range.
     
-    if not mp4_files:
+    Returns None when there is nothing to prune, so callers can skip the check.
+    """
+    if not patterns or not (start_date or end_date):
+        return None
+    
+    def is_out_of_range(path):
+        date_range = get_directory_date_range(os.path.relpath(path, directory), patterns)
+        if date_range is None:
+            return False
+        first, last = date_range
+        return bool((start_date and last < start_date) or (end_date and first > end_date))
+    
+    return is_out_of_range
+
+def get_mp4_files(directory, max_workers=1, prune=None):
+    """Recursively scan the directory and yield MP4 file paths as they are found.
+    
+    Raises ValueError once the scan completes if no MP4 files were found. With max_workers > 1 directories are listed concurrently, which hides the
+    round-trip latency of network volumes. The result is in the same order as
+    the serial os.walk() scan. Subdirectories for which prune(path) is true are
+    not descended into.
+    """
+    found = False
+    if max_workers > 1:
+        for root, names in walk_tree_parallel(directory, lambda d: list_directory(d, stat_files=False), max_workers, prune):
+            for name in names:
+                found = True
+                yield os.path.join(root, name)
+    else:
+        for root, dirs, files in os.walk(directory):
+            if prune:
+                dirs[:] = [d for d in dirs if not prune(os.path.join(root, d))]
+            for f in files:
+                if f.lower().endswith('.mp4'):
+                    found = True
+                    yield os.path.join(root, f)
+    
+    if not found:
         raise ValueError(f"No matching MP4 files found in {directory} or its subdirectories")
-    return mp4_files
 
-def get_video_duration(video_path):
-    """Get the duration of a video file using FFmpeg."""
+def read_manifest(manifest_path):
+    """Stream (path, duration) entries from a manifest of files to choose from.
+    
+    Each line is either a plain file path or a JSON object with a "path" key and
+    optional "size", "mtime" and "duration" keys. Duration is None when the
+    manifest doesn't provide it. Relative paths are resolved against the
+    manifest's directory. Blank lines are ignored.
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            
+            duration = None
+            if line.startswith('{'):
+                try:
+                    record = json.loads(line)
+                    file_path = record['path']
+                    if not isinstance(file_path, str):
+                        raise TypeError(f"path must be a string, not {type(file_path).__name__}")
+                    if record.get('duration') is not None:
+                        duration = float(record['duration'])
+                except (ValueError, KeyError, TypeError) as e:
+                    print(f"Warning: Skipping invalid manifest line {line_number}: {e}")
+                    continue
+            else:
+                file_path = line
+            
+            yield os.path.join(base_dir, file_path), duration
+
+def list_directory(directory, stat_files=True):
+    """List a directory once, returning its subdirectory names and MP4 file entries.
+    
+    MP4 entries are (name, size, mtime_ns) tuples, or plain names when
+    stat_files is False. Symlinked directories are not descended into,
+    matching os.walk().
+    """
+    subdirs = []
+    files = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            try:
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        subdirs.append(entry.name)
+                elif entry.name.lower().endswith('.mp4'):
+                    if stat_files:
+                        stat = entry.stat()
+                        files.append((entry.name, stat.st_size, stat.st_mtime_ns))
+                    else:
+                        files.append(entry.name)
+            except OSError as e:
+                print(f"Warning: Could not read {entry.path}: {e}")
+    return subdirs, files
+
+def walk_tree_parallel(directory, visit, max_workers, prune=None):
+    """Walk a directory tree, visiting up to max_workers directories at once.
+    
+    visit(path) must return (subdirectory names, payload); subdirectories are
+    submitted as soon as their parent has been visited, unless prune(path) is
+    true. Yields (path, payload) pairs in os.walk() top-down order regardless
+    of completion order, as soon as each one's predecessors are done.
+    Directories that cannot be read are reported and skipped.
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        pending = {executor.submit(visit, directory): directory}
+        submitted = {directory}
+        results = {}
+        failed = set()
+        # Next directories to emit, in serial top-down order
+        stack = [directory]
+        
+        while stack:
+            current = stack[-1]
+            if current in failed:
+                stack.pop()
+                continue
+            if current in results:
+                stack.pop()
+                subdirs, payload = results.pop(current)
+                yield current, payload
+                # Push subdirectories in reverse so they are visited in listing order
+                stack.extend(
+                    path for path in (os.path.join(current, name) for name in reversed(subdirs))
+                    if path in submitted
+                )
+                continue
+            
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    subdirs, payload = future.result()
+                except OSError as e:
+                    print(f"Warning: Could not scan {path}: {e}")
+                    failed.add(path)
+                    continue
+                results[path] = (subdirs, payload)
+                for name in subdirs:
+                    child = os.path.join(path, name)
+                    if prune and prune(child):
+                        continue
+                    pending[executor.submit(visit, child)] = child
+                    submitted.add(child)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def scan_mp4_files(directory, scan_state, max_workers=1, prune=None):
+    """Incrementally scan the directory tree for MP4 files.
+    
+    scan_state maps each directory path to (mtime_ns, subdirectory names, MP4
+    entries) from the previous scan and is updated in place. Only directories
+    whose mtime moved are listed again. The remembered files of directories
+    modified within DIRECTORY_RESTAT_WINDOW are stat'ed again, since editing a
+    file in place doesn't change its directory's mtime. Up to max_workers
+    directories are stat'ed or listed concurrently. Subdirectories for which prune(path) is true are skipped,
+    and their remembered state is kept as is. Returns the (path, size,
+    mtime_ns) entries in os.walk() order, the directories that were re-listed,
+    the directories that were pruned and the directories whose remembered
+    state changed (re-listed or with changed files).
+    """
+    now_ns = time.time_ns()
+    pruned = set()
+    
+    def record_prune(path):
+        if prune(path):
+            pruned.add(path)
+            return True
+        return False
+    
+    def visit(current):
+        mtime = os.stat(current).st_mtime_ns
+        cached = scan_state.get(current)
+        if cached and cached[0] == mtime:
+            # Older directories are trusted as is; stat'ing every file in a
+            # large library costs more than the rest of the scan
+            if now_ns - mtime >= DIRECTORY_RESTAT_WINDOW * 1_000_000_000:
+                return cached[1], (cached, False)
+            files = []
+            for name, size, mtime_ns in cached[2]:
+                try:
+                    stat = os.stat(os.path.join(current, name))
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    print(f"Warning: Could not read {os.path.join(current, name)}: {e}")
+                    files.append((name, size, mtime_ns))
+                    continue
+                files.append((name, stat.st_size, stat.st_mtime_ns))
+            if files == cached[2]:
+                return cached[1], (cached, False)
+            return cached[1], ((mtime, cached[1], files), None)
+        subdirs, files = list_directory(current)
+        # A directory changed within the grace window may still change
+        # without its mtime moving again, so don't trust it next time
+        if now_ns - mtime < DIRECTORY_MTIME_GRACE * 1_000_000_000:
+            mtime = None
+        return subdirs, ((mtime, subdirs, files), True)
+    
+    entries = []
+    relisted = []
+    updated = []
+    visited = list(walk_tree_parallel(directory, visit, max_workers, record_prune if prune else None))
+    for current, (listing, was_listed) in visited:
+        # was_listed is None when only the files' stats changed
+        if was_listed:
+            relisted.append(current)
+        if was_listed is not False:
+            updated.append(current)
+        entries.extend((os.path.join(current, name), size, mtime_ns) for name, size, mtime_ns in listing[2])
+    
+    # Replace the state, forgetting directories that no longer exist but
+    # keeping what we know about the subtrees we didn't look at
+    kept = {path: listing for path, listing in scan_state.items() if is_under_any(path, pruned, directory)}
+    scan_state.clear()
+    scan_state.update(kept)
+    scan_state.update((current, listing) for current, (listing, _) in visited)
+    
+    return entries, relisted, pruned, updated
+
+def is_under_any(path, directories, root):
+    """Check whether path is one of the given directories or lies beneath one of them."""
+    if not directories:
+        return False
+    while len(path) > len(root):
+        if path in directories:
+            return True
+        path = os.path.dirname(path)
+    return False
+
+class CommandRunner:
+    """Runs external commands concurrently on a background asyncio event loop.
+    
+    Commands are started with create_subprocess_exec from argument vectors (no
+    shell), and a semaphore caps how many run at once across all threads.
+    Blocking callers use run(); concurrent callers can use submit() to get a
+    concurrent.futures.Future, and cancelling it kills the process.
+    """
+    
+    def __init__(self, max_processes=MAX_PROCESSES):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="command-runner", daemon=True)
+        self._thread.start()
+        # Before Python 3.10 asyncio primitives bind to the loop current where
+        # they are created, so create the semaphore on the runner's loop
+        self._semaphore = asyncio.run_coroutine_threadsafe(self._create_semaphore(max_processes), self.loop).result()
+    
+    @staticmethod
+    async def _create_semaphore(value):
+        return asyncio.Semaphore(value)
+    
+    @staticmethod
+    async def _read_stream(stream, limit):
+        # Keep only the last `limit` bytes so chatty commands can't exhaust memory
+        data = bytearray()
+        while True:
+            chunk = await stream.read(64 * 1024)
+            if not chunk:
+                return bytes(data)
+            data += chunk
+            if limit is not None and len(data) > limit:
+                del data[:len(data) - limit]
+    
+    async def run_async(self, args, timeout=None, stdout_limit=None, stderr_limit=STDERR_LIMIT, text=True):
+        """Run a command and return a subprocess.CompletedProcess with its output.
+        
+        Output is decoded as text unless text is False, in which case stdout is
+        returned as bytes. A command that exceeds its timeout is killed and
+        reported with returncode -1. Cancellation also kills the process.
+        """
+        async with self._semaphore:
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                stdout, stderr, returncode = await asyncio.wait_for(
+                    asyncio.gather(
+                        self._read_stream(process.stdout, stdout_limit),
+                        self._read_stream(process.stderr, stderr_limit),
+                        process.wait()
+                    ),
+                    timeout
+                )
+            except asyncio.TimeoutError:
+                await self._kill(process)
+                return subprocess.CompletedProcess(args, -1, '' if text else b'', f"Timed out after {timeout} seconds")
+            except asyncio.CancelledError:
+                await self._kill(process)
+                raise
+        
+        return subprocess.CompletedProcess(
+            args, returncode,
+            stdout.decode('utf-8', errors='replace') if text else stdout,
+            stderr.decode('utf-8', errors='replace')
+        )
+    
+    @staticmethod
+    async def _kill(process):
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+            await process.wait()
+    
+    def submit(self, args, **kwargs):
+        """Start a command and return a concurrent.futures.Future for its result."""
+        return asyncio.run_coroutine_threadsafe(self.run_async(args, **kwargs), self.loop)
+    
+    def run(self, args, cancel=None, **kwargs):
+        """Run a command and wait for its result.
+        
+        If the threading.Event cancel is set while the command runs, the
+        process is killed and CancelledError is raised.
+        """
+        future = self.submit(args, **kwargs)
+        try:
+            if cancel is not None:
+                while not wait([future], timeout=0.1).done:
+                    if cancel.is_set():
+                        raise CancelledError()
+            return future.result()
+        except BaseException:
+            # E.g. KeyboardInterrupt: don't leave the process running
+            future.cancel()
+            raise
+
+command_runner = None
+command_runner_lock = threading.Lock()
+
+def get_command_runner():
+    """Return the shared command runner, starting it on first use."""
+    global command_runner
+    with command_runner_lock:
+        if command_runner is None:
+            command_runner = CommandRunner()
+        return command_runner
+
+def set_max_processes(max_processes):
+    """Replace the shared command runner with one allowing max_processes at once."""
+    global command_runner
+    with command_runner_lock:
+        command_runner = CommandRunner(max_processes)
+
+def run_command(args, **kwargs):
+    """Run an external command through the shared command runner."""
+    return get_command_runner().run(args, **kwargs)
+
+class ScratchBudgetExceeded(ValueError):
+    """Raised when a scratch workspace reservation would exceed its budget."""
+
+class ScratchWorkspace:
+    """Per-run workspace for temporary files, with unique names, a size budget and cleanup.
+    
+    Files live in a fresh directory under base_dir, or in anonymous memfds
+    (Linux only) when base_dir is 'memfd'.
+    """
+    
+    def __init__(self, base_dir=SCRATCH_DIR, budget=SCRATCH_BUDGET):
+        self.budget = budget
+        self.used = 0
+        self._sizes = {}  # path -> bytes reserved or written
+        self._memfds = {}  # path -> memfd file descriptor
+        self._counter = count(1)
+        self._lock = threading.Lock()
+        self.directory = None
+        if base_dir == 'memfd':
+            if not hasattr(os, 'memfd_create'):
+                raise ValueError("memfd scratch space is only available on Linux")
+        else:
+            if base_dir and not os.path.exists(base_dir):
+                os.makedirs(base_dir)
+            self.directory = tempfile.mkdtemp(prefix='dashcam-video-compiler-', dir=base_dir)
+    
+    def new_file(self, name, estimated_size=0):
+        """Reserve space for a new uniquely named file and return its path.
+        
+        Raises ScratchBudgetExceeded if the reservation would exceed the budget.
+        """
+        with self._lock:
+            if self.used + estimated_size > self.budget:
+                raise ScratchBudgetExceeded(f"Scratch space budget of {self.budget // (1024 * 1024)} MB exceeded")
+            stem, extension = os.path.splitext(name)
+            unique_name = f"{stem}_{next(self._counter):05d}{extension}"
+            if self.directory is None:
+                fd = os.memfd_create(unique_name)
+                path = f"/proc/{os.getpid()}/fd/{fd}"
+                self._memfds[path] = fd
+            else:
+                path = os.path.join(self.directory, unique_name)
+            self._sizes[path] = estimated_size
+            self.used += estimated_size
+            return path
+    
+    def update_size(self, path):
+        """Account for the actual size of a file once it has been written."""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        with self._lock:
+            if path in self._sizes:
+                self.used += size - self._sizes[path]
+                self._sizes[path] = size
+    
+    def remove(self, path):
+        """Delete a file from the workspace and release its space."""
+        with self._lock:
+            self.used -= self._sizes.pop(path, 0)
+            fd = self._memfds.pop(path, None)
+        if fd is not None:
+            os.close(fd)
+        elif os.path.exists(path):
+            os.remove(path)
+    
+    def cleanup(self):
+        """Delete the workspace and everything left in it."""
+        with self._lock:
+            fds = list(self._memfds.values())
+            self._memfds.clear()
+            self._sizes.clear()
+            self.used = 0
+        for fd in fds:
+            os.close(fd)
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+scratch_workspace = None
+scratch_workspace_lock = threading.Lock()
+
+def get_scratch_workspace():
+    """Return the scratch workspace for this run, creating it on first use."""
+    global scratch_workspace
+    with scratch_workspace_lock:
+        if scratch_workspace is None:
+            scratch_workspace = ScratchWorkspace()
+            atexit.register(scratch_workspace.cleanup)
+        return scratch_workspace
+
+def open_scratch_workspace(base_dir=SCRATCH_DIR, budget=SCRATCH_BUDGET):
+    """Create the scratch workspace for this run under base_dir with the given budget."""
+    global scratch_workspace
+    with scratch_workspace_lock:
+        scratch_workspace = ScratchWorkspace(base_dir, budget)
+        atexit.register(scratch_workspace.cleanup)
+        return scratch_workspace
+
+def remove_temp_files(paths):
+    """Remove temporary files from the scratch workspace."""
+    workspace = get_scratch_workspace()
+    for path in paths:
+        workspace.remove(path)
+
+# Sample entry types in the MP4 'stsd' box mapped to FFprobe codec names
+MP4_CODEC_NAMES = {
+    'avc1': 'h264', 'avc3': 'h264',
+    'hvc1': 'hevc', 'hev1': 'hevc',
+    'mp4v': 'mpeg4', 'av01': 'av1', 'vp09': 'vp9',
+    'mp4a': 'aac', 'ac-3': 'ac3', 'ec-3': 'eac3', 'Opus': 'opus',
+    'ipcm': 'pcm_s16le', 'sowt': 'pcm_s16le', 'twos': 'pcm_s16be',
+}
+MP4_HANDLER_TYPES = {'vide': 'video', 'soun': 'audio', 'text': 'subtitle', 'sbtl': 'subtitle', 'meta': 'data'}
+MP4_MAX_MOOV_SIZE = 64 * 1024 * 1024  # Refuse to read absurdly large (likely corrupt) moov boxes
+
+def iter_mp4_boxes(data, start=0, end=None):
+    """Yield (type, payload start, payload end) for the boxes in data[start:end]."""
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, offset)
+        header = 8
+        if size == 1:
+            if offset + 16 > end:
+                return
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            return
+        yield box_type.decode('latin-1'), offset + header, offset + size
+        offset += size
+
+def find_mp4_box(data, path, start=0, end=None):
+    """Find the first box along a path like 'trak/mdia/mdhd', returning (payload start, end) or None."""
+    for box_type, payload_start, payload_end in iter_mp4_boxes(data, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return payload_start, payload_end
+            return find_mp4_box(data, path[1:], payload_start, payload_end)
+    return None
+
+def iter_mp4_file_boxes(f, file_size):
+    """Yield (type, offset, header size, size) for the top-level boxes of an open MP4 file.
+    
+    Only the box headers are read, seeking over the payloads. Stops at the
+    first malformed header.
+    """
+    offset = 0
+    while offset + 8 <= file_size:
+        f.seek(offset)
+        header = f.read(16)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack_from('>I4s', header)
+        header_size = 8
+        if size == 1:
+            if len(header) < 16:
+                return
+            size = struct.unpack_from('>Q', header, 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = file_size - offset
+        if size < header_size:
+            return
+        yield box_type.decode('latin-1'), offset, header_size, size
+        offset += size
+
+def read_mp4_moov(video_path):
+    """Read the 'moov' box of an MP4 file without touching the media data.
+    
+    Only the top-level box headers are read, seeking over 'mdat', so this costs
+    a handful of small reads wherever the 'moov' box is. Returns the moov
+    payload, or None if the file has no usable moov (e.g. still being written).
+    """
+    with open(video_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        for box_type, offset, header_size, size in iter_mp4_file_boxes(f, file_size):
+            if box_type == 'moov':
+                if size > MP4_MAX_MOOV_SIZE or offset + size > file_size:
+                    return None
+                f.seek(offset + header_size)
+                return f.read(size - header_size)
+    return None
+
+def read_mp4_sample_runs(data, box):
+    """Read the (count, value) runs of an stts or ctts box."""
+    start, _ = box
+    version = data[start]
+    entry_count = struct.unpack_from('>I', data, start + 4)[0]
+    run_format = '>Ii' if version == 1 else '>II'
+    return [struct.unpack_from(run_format, data, start + 8 + 8 * i) for i in range(entry_count)]
+
+def lookup_mp4_sample_runs(runs, sample_numbers, accumulate):
+    """Map sorted 1-based sample numbers to values from stts/ctts style runs.
+    
+    With accumulate the values are summed over preceding samples (decode
+    timestamps from stts deltas); otherwise each sample gets its run's value
+    (composition offsets from ctts).
+    """
+    values = []
+    targets = iter(sample_numbers)
+    target = next(targets, None)
+    first_sample = 1
+    total = 0
+    for run_length, value in runs:
+        while target is not None and target < first_sample + run_length:
+            values.append(total + (target - first_sample) * value if accumulate else value)
+            target = next(targets, None)
+        first_sample += run_length
+        total += run_length * value
+    # Samples beyond the table (malformed files) get the last known value
+    while target is not None:
+        values.append(total if accumulate else 0)
+        target = next(targets, None)
+    return values
+
+def get_mp4_track_keyframes(moov, trak_start, trak_end, timescale):
+    """Return the presentation times (seconds) of a track's sync samples, sorted."""
+    stbl = find_mp4_box(moov, ['mdia', 'minf', 'stbl'], trak_start, trak_end)
+    if stbl is None:
+        return None
+    stts = find_mp4_box(moov, ['stts'], *stbl)
+    if stts is None:
+        return None
+    stts_runs = read_mp4_sample_runs(moov, stts)
+    
+    stss = find_mp4_box(moov, ['stss'], *stbl)
+    if stss is not None:
+        entry_count = struct.unpack_from('>I', moov, stss[0] + 4)[0]
+        sync_samples = sorted(struct.unpack_from(f'>{entry_count}I', moov, stss[0] + 8))
+    else:
+        # Without an stss box every sample is a sync sample
+        sync_samples = range(1, sum(run_length for run_length, _ in stts_runs) + 1)
+    
+    times = lookup_mp4_sample_runs(stts_runs, sync_samples, accumulate=True)
+    ctts = find_mp4_box(moov, ['ctts'], *stbl)
+    if ctts is not None:
+        offsets = lookup_mp4_sample_runs(read_mp4_sample_runs(moov, ctts), sync_samples, accumulate=False)
+        times = [t + offset for t, offset in zip(times, offsets)]
+    
+    # Keyframes before the start of the presentation can't be cut at
+    media_start = get_mp4_media_start(moov, trak_start, trak_end)
+    return sorted(t for t in ((t - media_start) / timescale for t in times) if t >= 0)
+
+def get_mp4_media_start(moov, trak_start, trak_end):
+    """Return the media time a track's edit list shows first (e.g. to hide B-frame delay), or 0."""
+    elst = find_mp4_box(moov, ['edts', 'elst'], trak_start, trak_end)
+    if elst is not None:
+        version = moov[elst[0]]
+        entry_count = struct.unpack_from('>I', moov, elst[0] + 4)[0]
+        entry_format, entry_size = ('>Qq', 20) if version == 1 else ('>Ii', 12)
+        for i in range(entry_count):
+            _, media_time = struct.unpack_from(entry_format, moov, elst[0] + 8 + entry_size * i)
+            if media_time >= 0:
+                return media_time
+    return 0
+
+def parse_mp4_info(video_path):
+    """Read the duration and basic stream parameters from an MP4 file's header boxes.
+    
+    Parses mvhd, tkhd, mdhd, hdlr and stsd in-process instead of running
+    FFprobe, plus the sample tables of the first video track to find its
+    keyframes. Returns a dict shaped like probe_video()'s result with an extra
+    'keyframes' list, or None if the file can't be parsed (fragmented,
+    truncated or not MP4).
+    """
+    try:
+        moov = read_mp4_moov(video_path)
+        if moov is None:
+            return None
+        
+        mvhd = find_mp4_box(moov, ['mvhd'])
+        if mvhd is None:
+            return None
+        version = moov[mvhd[0]]
+        if version == 1:
+            timescale, duration = struct.unpack_from('>IQ', moov, mvhd[0] + 20)
+        else:
+            timescale, duration = struct.unpack_from('>II', moov, mvhd[0] + 12)
+        if not timescale or not duration:
+            # Fragmented files keep their duration in the fragments
+            return None
+        
+        streams = []
+        keyframes = None
+        for box_type, trak_start, trak_end in iter_mp4_boxes(moov):
+            if box_type != 'trak':
+                continue
+            stream = {}
+            
+            hdlr = find_mp4_box(moov, ['mdia', 'hdlr'], trak_start, trak_end)
+            if hdlr:
+                handler = moov[hdlr[0] + 8:hdlr[0] + 12].decode('latin-1')
+                stream['codec_type'] = MP4_HANDLER_TYPES.get(handler, 'data')
+            
+            stsd = find_mp4_box(moov, ['mdia', 'minf', 'stbl', 'stsd'], trak_start, trak_end)
+            if stsd and stsd[1] - stsd[0] >= 16:
+                fourcc = moov[stsd[0] + 12:stsd[0] + 16].decode('latin-1')
+                stream['codec_name'] = MP4_CODEC_NAMES.get(fourcc, fourcc.strip())
+            
+            tkhd = find_mp4_box(moov, ['tkhd'], trak_start, trak_end)
+            if tkhd and stream.get('codec_type') == 'video':
+                # Width and height are 16.16 fixed point at the end of tkhd
+                width, height = struct.unpack_from('>II', moov, tkhd[1] - 8)
+                stream['width'] = width >> 16
+                stream['height'] = height >> 16
+            
+            mdhd = find_mp4_box(moov, ['mdia', 'mdhd'], trak_start, trak_end)
+            if mdhd:
+                if moov[mdhd[0]] == 1:
+                    track_timescale, track_duration = struct.unpack_from('>IQ', moov, mdhd[0] + 20)
+                else:
+                    track_timescale, track_duration = struct.unpack_from('>II', moov, mdhd[0] + 12)
+                if track_timescale:
+                    stream['duration'] = track_duration / track_timescale
+                    if stream.get('codec_type') == 'video' and keyframes is None:
+                        keyframes = get_mp4_track_keyframes(moov, trak_start, trak_end, track_timescale)
+            
+            streams.append(stream)
+        
+        return {
+            'duration': duration / timescale,
+            'streams': streams,
+            'keyframes': keyframes
+        }
+    except (OSError, struct.error, IndexError):
+        return None
+
+def find_mp4_samples_in_time(stts_runs, start, end):
+    """Return the first and last 1-based sample numbers whose decode intervals overlap [start, end] (track timescale), or None."""
+    first = last = None
+    sample = 1
+    time = 0
+    for run_length, delta in stts_runs:
+        if delta > 0:
+            lo = max(0, math.floor((start - time) / delta))
+            hi = min(run_length - 1, math.floor((end - time) / delta))
+        else:
+            lo, hi = (0, run_length - 1) if start <= time <= end else (1, 0)
+        if lo <= hi:
+            first = first or sample + lo
+            last = sample + hi
+        sample += run_length
+        time += run_length * delta
+    return (first, last) if first else None
+
+def get_mp4_sample_span(chunk_offsets, stsc_entries, sample_sizes, first, last):
+    """Return the (start, end) file offsets spanned by samples first..last of a track, or None."""
+    span = None
+    sample = 1
+    bounds = stsc_entries + [(len(chunk_offsets) + 1, 0)]
+    for (first_chunk, per_chunk), (next_chunk, _) in zip(bounds, bounds[1:]):
+        for chunk in range(first_chunk, min(next_chunk, len(chunk_offsets) + 1)):
+            if sample > last:
+                return span
+            if sample + per_chunk > first:
+                offset = chunk_offsets[chunk - 1]
+                for number in range(sample, sample + per_chunk):
+                    size = sample_sizes[number - 1] if number <= len(sample_sizes) else 0
+                    if first <= number <= last:
+                        if span is None:
+                            span = (offset, offset + size)
+                        else:
+                            span = (min(span[0], offset), max(span[1], offset + size))
+                    offset += size
+            sample += per_chunk
+    return span
+
+def get_mp4_byte_ranges(video_path, segments, margin=PREFETCH_MARGIN):
+    """Return the merged (offset, length) byte ranges FFmpeg reads to cut segments from an MP4 file.
+    
+    Returns None when the ranges can't be trusted to cover every read, e.g.
+    for fragmented files, so the caller reads the source instead.
+    """
+    try:
+        with open(video_path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            ranges = []
+            for box_type, offset, header_size, size in iter_mp4_file_boxes(f, file_size):
+                ranges.append((offset, header_size if box_type == 'mdat' else size))
+        moov = read_mp4_moov(video_path)
+        if moov is None or find_mp4_box(moov, ['mvex']) is not None:
+            # Fragmented files keep their samples in moof boxes the tables don't describe
+            return None
+        
+        tracks = []
+        for box_type, trak_start, trak_end in iter_mp4_boxes(moov):
+            if box_type != 'trak':
+                continue
+            mdhd = find_mp4_box(moov, ['mdia', 'mdhd'], trak_start, trak_end)
+            stbl = find_mp4_box(moov, ['mdia', 'minf', 'stbl'], trak_start, trak_end)
+            if mdhd is None or stbl is None:
+                return None
+            timescale = struct.unpack_from('>I', moov, mdhd[0] + (20 if moov[mdhd[0]] == 1 else 12))[0]
+            stts = find_mp4_box(moov, ['stts'], *stbl)
+            stsc = find_mp4_box(moov, ['stsc'], *stbl)
+            stsz = find_mp4_box(moov, ['stsz'], *stbl)
+            stco = find_mp4_box(moov, ['stco'], *stbl)
+            co64 = find_mp4_box(moov, ['co64'], *stbl)
+            if not timescale or None in (stts, stsc, stsz) or stco is None and co64 is None:
+                return None
+            
+            stts_runs = read_mp4_sample_runs(moov, stts)
+            entry_count = struct.unpack_from('>I', moov, stsc[0] + 4)[0]
+            stsc_entries = [struct.unpack_from('>II', moov, stsc[0] + 8 + 12 * i) for i in range(entry_count)]
+            sample_size, sample_count = struct.unpack_from('>II', moov, stsz[0] + 4)
+            if sample_size:
+                sample_sizes = [sample_size] * sample_count
+            else:
+                sample_sizes = struct.unpack_from(f'>{sample_count}I', moov, stsz[0] + 12)
+            if stco is not None:
+                entry_count = struct.unpack_from('>I', moov, stco[0] + 4)[0]
+                chunk_offsets = struct.unpack_from(f'>{entry_count}I', moov, stco[0] + 8)
+            else:
+                entry_count = struct.unpack_from('>I', moov, co64[0] + 4)[0]
+                chunk_offsets = struct.unpack_from(f'>{entry_count}Q', moov, co64[0] + 8)
+            if not sample_count or not chunk_offsets or not stsc_entries:
+                return None
+            
+            # (presentation time, decode time) of the sync samples, which seeks land on
+            stss = find_mp4_box(moov, ['stss'], *stbl)
+            if stss is not None:
+                entry_count = struct.unpack_from('>I', moov, stss[0] + 4)[0]
+                sync_samples = sorted(struct.unpack_from(f'>{entry_count}I', moov, stss[0] + 8))
+            else:
+                sync_samples = range(1, sample_count + 1)
+            decode_times = lookup_mp4_sample_runs(stts_runs, sync_samples, accumulate=True)
+            offsets = [0] * len(decode_times)
+            ctts = find_mp4_box(moov, ['ctts'], *stbl)
+            if ctts is not None:
+                offsets = lookup_mp4_sample_runs(read_mp4_sample_runs(moov, ctts), sync_samples, accumulate=False)
+            sync_times = sorted((t + offset, t) for t, offset in zip(decode_times, offsets))
+            
+            tracks.append({
+                'timescale': timescale,
+                'media_start': get_mp4_media_start(moov, trak_start, trak_end),
+                'duration': sum(run_length * delta for run_length, delta in stts_runs),
+                'stts_runs': stts_runs,
+                'stsc_entries': stsc_entries,
+                'sample_sizes': sample_sizes,
+                'chunk_offsets': chunk_offsets,
+                'sync_times': sync_times,
+            })
+        if not tracks:
+            return None
+        
+        # FFmpeg reads the first packets to probe the streams before it seeks
+        windows = []
+        for start, duration in [(0, 0)] + list(segments):
+            seek_start = start
+            for track in tracks:
+                # FFmpeg seeks 3/23 s early when a stream has B-frames
+                target = (start - 3 / 23) * track['timescale'] + track['media_start']
+                index = bisect.bisect_right(track['sync_times'], (target, float('inf'))) - 1
+                decode_time = track['sync_times'][index][1] if index >= 0 else 0
+                seek_start = min(seek_start, (decode_time - track['media_start']) / track['timescale'])
+            # The margin covers decode order and demuxer read-ahead
+            windows.append((seek_start - margin, start + duration + margin))
+        
+        for track in tracks:
+            timescale = track['timescale']
+            media_start = track['media_start']
+            for start, end in windows:
+                samples = find_mp4_samples_in_time(
+                    track['stts_runs'], start * timescale + media_start, end * timescale + media_start
+                )
+                span = samples and get_mp4_sample_span(
+                    track['chunk_offsets'], track['stsc_entries'], track['sample_sizes'], *samples
+                )
+                if span:
+                    ranges.append((span[0], span[1] - span[0]))
+                elif max(start * timescale + media_start, 0) < track['duration']:
+                    # The track has media here that the tables don't map to bytes
+                    return None
+    except (OSError, struct.error, IndexError):
+        return None
+    
+    merged = []
+    for offset, length in sorted(ranges):
+        length = min(length, file_size - offset)
+        if merged and offset <= merged[-1][0] + merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], offset + length - merged[-1][0]))
+        elif length > 0:
+            merged.append((offset, length))
+    return merged
+
+def get_user_cache_dir():
+    """Return the per-user cache directory for this tool."""
+    if sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'dashcam-video-compiler')
+
+class ProbeCache:
+    """Persistent cache of probe results keyed by (device, inode, size, mtime).
+    
+    Any change to a file changes its key, so stale entries are never returned;
+    they simply age out. Entries are evicted least recently used first once
+    there are more than max_entries.
+    """
+    
+    def __init__(self, cache_path, max_entries=PROBE_CACHE_MAX_ENTRIES):
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._pending_writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS probes (
+                device INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime INTEGER NOT NULL,
+                info TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (device, inode, size, mtime)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS probes_last_used ON probes (last_used)")
+        self._conn.commit()
+    
+    @staticmethod
+    def key(video_path):
+        """Return the cache key of a file, or None if it can't be stat'ed."""
+        try:
+            stat = os.stat(video_path)
+        except OSError:
+            return None
+        return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+    
+    def get(self, key):
+        """Return the cached probe result for a key, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT info FROM probes WHERE device = ? AND inode = ? AND size = ? AND mtime = ?", key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE probes SET last_used = ? WHERE device = ? AND inode = ? AND size = ? AND mtime = ?",
+                (time.time(), *key)
+            )
+            self._written()
+            return json.loads(row[0])
+    
+    def put(self, key, info):
+        """Store (or replace) the probe result for a key."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO probes (device, inode, size, mtime, info, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, json.dumps(info), time.time())
+            )
+            self._written()
+    
+    def _written(self):
+        # Commit in batches; committing every lookup would make hits cost an fsync
+        self._pending_writes += 1
+        if self._pending_writes >= 100:
+            self._conn.commit()
+            self._pending_writes = 0
+    
+    def close(self):
+        """Evict least recently used entries beyond the cap and close the cache."""
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.execute(
+                "DELETE FROM probes WHERE rowid IN "
+                "(SELECT rowid FROM probes ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
+
+probe_cache = None
+
+def open_probe_cache(cache_path=None, max_entries=PROBE_CACHE_MAX_ENTRIES):
+    """Enable the persistent probe cache for this run."""
+    global probe_cache
+    if cache_path is None:
+        cache_path = os.path.join(get_user_cache_dir(), 'probe-cache.sqlite')
+    try:
+        probe_cache = ProbeCache(cache_path, max_entries)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Warning: Could not open probe cache {cache_path}: {e}")
+        return None
+    atexit.register(probe_cache.close)
+    return probe_cache
+
+def probe_video(video_path):
+    """Get the duration and stream parameters of a video file.
+    
+    Results are served from the probe cache when it is enabled. Otherwise MP4
+    header boxes are parsed in-process, and FFprobe is only run for files the
+    parser can't handle.
+    """
+    key = probe_cache.key(video_path) if probe_cache else None
+    if key is not None:
+        info = probe_cache.get(key)
+        if info is not None:
+            return info
+    
+    info = parse_mp4_info(video_path)
+    if info is None:
+        info = run_ffprobe(video_path)
+    if info is not None and key is not None:
+        probe_cache.put(key, info)
+    return info
+
+def run_ffprobe(video_path):
+    """Get the duration and stream parameters of a video file using FFprobe."""
     try:
         cmd = [
             'ffprobe',
             '-v', 'error',
-            '-show_entries', 'format=duration',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            shlex.quote(video_path)
+            '-show_entries', 'format=duration:stream=codec_type,codec_name,width,height,r_frame_rate',
+            '-of', 'json',
+            video_path
         ]
         
-        result = subprocess.run(' '.join(cmd), shell=True, capture_output=True, text=True)
+        result = run_command(cmd, timeout=PROBE_TIMEOUT)
         if result.returncode != 0:
             print(f"Error getting duration for {video_path}: {result.stderr}")
             return None
-        return float(result.stdout.strip())
+        info = json.loads(result.stdout)
+        return {
+            'duration': float(info['format']['duration']),
+            'streams': info.get('streams', [])
+        }
     except Exception as e:
         print(f"Failed to get duration for {video_path}: {str(e)}")
         return None
 
-def get_random_clip(video_path, clip_duration_range):
-    """Extract a random clip of specified duration range from the video."""
-    video_duration = get_video_duration(video_path)
+def probe_candidates(entries, max_workers=PROBE_WORKERS, on_probe=None):
+    """Yield (path, duration, keyframes) for (path, duration) entries, in order.
     
-    if video_duration is None:
-        print(f"Skipping {video_path}: Could not determine video duration")
-        return None
+    Files without a known duration are probed in the background with up to
+    max_workers probes running ahead of the consumer, so only the candidates
+    that are actually drawn get probed. on_probe(path, info) is called from
+    the consuming thread for every successful probe. Duration is None for
+    files that couldn't be probed, and keyframes None when not known yet.
+    """
+    iterator = iter(entries)
+    window = deque()  # (path, duration, probe future or None)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while True:
+            # Keep the next few unknown files probing ahead of the consumer
+            while len(window) < 2 * max_workers:
+                entry = next(iterator, _EXHAUSTED)
+                if entry is _EXHAUSTED:
+                    break
+                video_path, duration = entry
+                window.append((video_path, duration, None if duration is not None else executor.submit(probe_video, video_path)))
+            if not window:
+                return
+            
+            video_path, duration, future = window.popleft()
+            keyframes = None
+            if future is not None:
+                info = future.result()
+                if info is not None:
+                    duration = info['duration']
+                    if info.get('keyframes'):
+                        keyframes = tuple(info['keyframes'])
+                    if on_probe:
+                        on_probe(video_path, info)
+            yield video_path, duration, keyframes
+    finally:
+        # Drop probes for candidates that will never be drawn
+        for _, _, future in window:
+            if future is not None:
+                future.cancel()
+        executor.shutdown()
+
+@lru_cache(maxsize=4096)
+def get_keyframe_times(video_path):
+    """Return the sorted keyframe times (seconds) of a video, read once per run.
     
-    # Ensure the video is long enough for the minimum clip duration
-    if video_duration < clip_duration_range[0]:
-        print(f"Skipping {video_path}: Video duration ({video_duration}s) is too short")
-        return None
+    Uses the cached probe result or the MP4 sync-sample table, and falls back
+    to FFprobe's packet flags; the duration is never probed here. Returns an
+    empty tuple if the keyframes can't be determined.
+    """
+    key = probe_cache.key(video_path) if probe_cache else None
+    info = probe_cache.get(key) if key is not None else None
+    if info is not None and info.get('keyframes'):
+        return tuple(info['keyframes'])
+    
+    mp4_info = parse_mp4_info(video_path)
+    if mp4_info is not None and mp4_info.get('keyframes'):
+        if key is not None:
+            probe_cache.put(key, mp4_info)
+        return tuple(mp4_info['keyframes'])
     
+    keyframes = read_keyframes_with_ffprobe(video_path)
+    if keyframes and info is not None:
+        probe_cache.put(key, dict(info, keyframes=list(keyframes)))
+    return keyframes
+
+def read_keyframes_with_ffprobe(video_path):
+    """Get the sorted keyframe times of a video from FFprobe's packet flags."""
+    try:
+        cmd = [
+            'ffprobe',
+            '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,flags',
+            '-of', 'csv=p=0',
+            video_path
+        ]
+        
+        result = run_command(cmd, timeout=PROBE_TIMEOUT)
+        if result.returncode != 0:
+            print(f"Error getting keyframes for {video_path}: {result.stderr}")
+            return ()
+        keyframes = []
+        for line in result.stdout.splitlines():
+            pts_time, _, flags = line.partition(',')
+            if 'K' in flags and pts_time not in ('', 'N/A'):
+                keyframes.append(float(pts_time))
+        return tuple(sorted(keyframes))
+    except Exception as e:
+        print(f"Failed to get keyframes for {video_path}: {str(e)}")
+        return ()
+
+def plan_clip(video_duration, clip_duration_range, keyframes=(), rng=random):
+    """Pick a random (start_time, clip_duration) for a clip within the video.
+    
+    With stream copy a clip can only really start on a keyframe, so when the
+    keyframes are known the start is moved back to the keyframe at or before
+    the random point, and the end is moved to the nearest keyframe that keeps
+    the clip within clip_duration_range. The planned duration then matches
+    what FFmpeg actually writes.
+    """
     # Randomly select clip duration within the range
-    clip_duration = random.uniform(clip_duration_range[0], clip_duration_range[1])
+    clip_duration = rng.uniform(clip_duration_range[0], clip_duration_range[1])
     
     # Ensure the clip duration doesn't exceed the video duration
     clip_duration = min(clip_duration, video_duration)
     
     # Randomly select start time, ensuring the clip fits within the video
     max_start_time = video_duration - clip_duration
-    start_time = random.uniform(0, max_start_time)
+    start_time = rng.uniform(0, max_start_time)
+    
+    if keyframes:
+        start_time = keyframes[max(0, bisect.bisect_right(keyframes, start_time) - 1)]
+        
+        # End on a keyframe if one lies within the allowed clip durations
+        lo = bisect.bisect_left(keyframes, start_time + clip_duration_range[0])
+        hi = bisect.bisect_right(keyframes, min(start_time + clip_duration_range[1], video_duration))
+        if lo < hi:
+            target_end = start_time + clip_duration
+            clip_duration = min(keyframes[lo:hi], key=lambda t: abs(t - target_end)) - start_time
+        clip_duration = min(clip_duration, video_duration - start_time)
+    
+    return start_time, clip_duration
+
+def plan_clips(video_duration, clip_duration_range, clip_count=1, keyframes=(), rng=random):
+    """Pick up to `clip_count` non-overlapping random clips within the video, in time order.
+    
+    The video is split into equal slots and one clip is planned in each with
+    plan_clip(). When the keyframes are known, a slot's clip may start from
+    the keyframe at or before the slot start (unless that overlaps the
+    previous clip), so snapping never pushes a clip past the slot end. Fewer
+    clips are returned when the video is too short to fit `clip_count` clips of
+    the minimum duration, or when no keyframe in a slot leaves room for one
+    (possibly none at all).
+    """
+    clip_count = max(1, min(clip_count, int(video_duration // clip_duration_range[0])))
+    slot_duration = video_duration / clip_count
+    segments = []
+    previous_end = 0
+    for i in range(clip_count):
+        slot_start = i * slot_duration
+        slot_end = min(slot_start + slot_duration, video_duration)
+        window_start = slot_start
+        if keyframes:
+            index = bisect.bisect_right(keyframes, slot_start) - 1
+            if index < 0 or keyframes[index] < previous_end:
+                index = bisect.bisect_left(keyframes, previous_end)
+            if index >= len(keyframes) or slot_end - keyframes[index] < clip_duration_range[0]:
+                continue
+            window_start = keyframes[index]
+        window_keyframes = [
+            t - window_start
+            for t in keyframes[bisect.bisect_left(keyframes, window_start):bisect.bisect_left(keyframes, slot_end)]
+        ]
+        start_time, clip_duration = plan_clip(slot_end - window_start, clip_duration_range, window_keyframes, rng)
+        segments.append((window_start + start_time, clip_duration))
+        previous_end = window_start + start_time + clip_duration
+    return segments
+
+def get_video_duration(video_path):
+    """Get the duration of a video file, from the probe cache, its MP4 header or FFprobe."""
+    info = probe_video(video_path)
+    if info is None:
+        return None
+    return info['duration']
+
+def format_seek_time(start_time):
+    """Format a start time for '-ss' so it can't land just before a keyframe.
+    
+    FFmpeg seeks to the keyframe at or before the requested time, so a value a
+    hair below a keyframe would pull in the whole previous GOP. Rounding up to
+    whole microseconds, FFmpeg's time resolution, never moves past the frame.
+    """
+    return f"{math.ceil(start_time * 1_000_000) / 1_000_000:.6f}"
+
+def parse_progress_duration(progress_output):
+    """Return the output duration in seconds from FFmpeg '-progress' output, or None."""
+    duration = None
+    for line in progress_output.splitlines():
+        key, _, value = line.partition('=')
+        if key == 'out_time_us' and value.strip().lstrip('-').isdigit():
+            duration = int(value) / 1_000_000
+    return duration
+
+def get_random_clip(video_path, clip_duration_range, video_duration=None, keyframes=None, rng=random, clip_count=1,
+                    cancel=None):
+    """Extract up to `clip_count` random clips of specified duration range from the video.
+    
+    If the duration or keyframe times of the source are already known (e.g.
+    from the catalog or an earlier probe) they can be passed in to avoid
+    reading the file again. rng is the random generator used to plan the clips,
+    and setting the threading.Event cancel stops the extraction. Returns a list
+    of (temporary clip path, duration) in time order, or None on failure.
+    """
+    if video_duration is None:
+        video_duration = get_video_duration(video_path)
+    
+    if video_duration is None:
+        print(f"Skipping {video_path}: Could not determine video duration")
+        return None
+    
+    # Ensure the video is long enough for the minimum clip duration
+    if video_duration < clip_duration_range[0]:
+        print(f"Skipping {video_path}: Video duration ({video_duration}s) is too short")
+        return None
     
-    # Create a temporary clip file
-    temp_clip = f"temp_clip_{random.randint(1000, 9999)}.mp4"
+    if keyframes is None:
+        keyframes = get_keyframe_times(video_path)
+    segments = plan_clips(video_duration, clip_duration_range, clip_count, keyframes, rng)
+    if not segments:
+        print(f"Skipping {video_path}: No keyframe leaves room for a {clip_duration_range[0]:.1f}s clip")
+        return None
+    return extract_segments(video_path, segments, video_duration, cancel)
+
+def extract_segments(video_path, segments, video_duration, cancel=None):
+    """Extract the (start_time, duration) segments of a video in a single FFmpeg run.
+    
+    The source is opened and its index read once however many segments are
+    taken from it: FFmpeg seeks to the first segment and writes every segment
+    as a separate output in the scratch workspace. Returns a list of
+    (temporary clip path, duration), or None on failure.
+    """
+    workspace = get_scratch_workspace()
+    temp_clips = []
+    first_start = segments[0][0]
     
     try:
-        # Extract the clip using FFmpeg
-        cmd = [
-            'ffmpeg',
-            '-ss', str(start_time),
-            '-t', str(clip_duration),
-            '-i', shlex.quote(video_path),
-            '-c', 'copy',  # Copy streams without re-encoding
-            '-y',  # Overwrite output file if it exists
-            shlex.quote(temp_clip)
+        # Reserve a temporary file for each clip, sized after the source's bitrate
+        bytes_per_second = os.path.getsize(video_path) / max(video_duration, 1)
+        for _, clip_duration in segments:
+            temp_clips.append(workspace.new_file('clip.mp4', int(bytes_per_second * clip_duration)))
+        
+        # Extract the clips using FFmpeg
+        cmd = ['ffmpeg', '-ss', format_seek_time(first_start)]
+        if len(segments) == 1:
+            cmd += ['-t', str(segments[0][1])]
+        cmd += [
+            '-i', video_path,
+            '-progress', 'pipe:1',  # Report the written duration on stdout
+            '-nostats',
         ]
+        for index, ((start_time, clip_duration), temp_clip) in enumerate(zip(segments, temp_clips)):
+            if index > 0:
+                # Output-side seeking drops packets before -ss but keeps -ss as
+                # the output's time origin, so start reading a little early and
+                # shift the timestamps back to put the keyframe at zero
+                lead = min(SEGMENT_SEEK_LEAD, start_time - first_start)
+                cmd += [
+                    '-ss', f"{start_time - first_start - lead:.4f}",
+                    '-output_ts_offset', f"{-lead:.4f}",
+                    '-t', str(clip_duration + lead),
+                ]
+            elif len(segments) > 1:
+                cmd += ['-t', str(clip_duration)]
+            cmd += [
+                '-c', 'copy',  # Copy streams without re-encoding
+                '-f', 'mp4',  # In-memory scratch files have no extension
+                '-y',  # Overwrite output file if it exists
+                temp_clip
+            ]
         
-        result = subprocess.run(' '.join(cmd), shell=True, capture_output=True, text=True)
+        # Only the last progress report matters
+        result = run_command(cmd, timeout=EXTRACT_TIMEOUT, stdout_limit=STDERR_LIMIT, cancel=cancel)
         if result.returncode != 0:
             print(f"Error creating clip from {video_path}: {result.stderr}")
-            if os.path.exists(temp_clip):
-                os.remove(temp_clip)
+            remove_temp_files(temp_clips)
             return None
             
-        # Verify the clip was created and has content
-        if not os.path.exists(temp_clip) or os.path.getsize(temp_clip) == 0:
+        # Verify the clips were created and have content
+        if not all(os.path.exists(clip) and os.path.getsize(clip) > 0 for clip in temp_clips):
             print(f"Failed to create clip from {video_path}: Output file is missing or empty")
+            remove_temp_files(temp_clips)
             return None
+        for clip in temp_clips:
+            workspace.update_size(clip)
+        
+        if len(segments) > 1:
+            # Progress covers all outputs at once, so use the planned durations,
+            # which are keyframe-accurate when the keyframes are known
+            return [(clip, clip_duration) for clip, (_, clip_duration) in zip(temp_clips, segments)]
+        
+        # Use the duration FFmpeg reports instead of probing the file we just wrote
+        actual_duration = parse_progress_duration(result.stdout)
+        if not actual_duration:
+            actual_duration = segments[0][1]
+        
+        return [(temp_clips[0], actual_duration)]
+    except CancelledError:
+        remove_temp_files(temp_clips)
+        return None
+    except ScratchBudgetExceeded:
+        # Not the source's fault: every further clip would fail the same way
+        remove_temp_files(temp_clips)
+        raise
+    except Exception as e:
+        print(f"Failed to create clip from {video_path}: {str(e)}")
+        remove_temp_files(temp_clips)
+        return None
+
+def get_percentile(values, percentile):
+    """Return the nearest-rank percentile of a non-empty list of values."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percentile / 100 * len(ordered)) - 1)]
+
+def get_clip_budget(remaining, clips_per_file=1):
+    """Return the clip duration range and clip count for the next file given the remaining duration.
+    
+    While a full clip still fits, files get normal clips (fewer of them if
+    not all fit). Otherwise the file gets a single final clip of exactly the
+    remaining duration: its start is snapped to a keyframe and stream copy
+    can end it on any frame, so the output lands on the target instead of
+    overshooting it by up to a whole clip.
+    """
+    if remaining >= CLIP_DURATION_RANGE[1]:
+        return CLIP_DURATION_RANGE, min(clips_per_file, int(remaining // CLIP_DURATION_RANGE[1]))
+    return (remaining, remaining), 1
+
+def get_locality_key(video_path):
+    """Return a sort key approximating where a file lies on disk: device, directory, then inode."""
+    directory = os.path.dirname(video_path)
+    try:
+        stat = os.stat(video_path)
+    except OSError:
+        return 0, directory, 0
+    return stat.st_dev, directory, stat.st_ino
+
+def extract_clips(candidates, target_duration, workers=EXTRACT_WORKERS, clips_per_file=1,
+                  hedge_percentile=HEDGE_PERCENTILE, locality_window=LOCALITY_WINDOW):
+    """Extract random clips from candidate files until the target duration is reached.
+
+    Returns the clips in selection order, their total duration, the number of
+    skipped videos and a dict of hedging statistics.
+    """
+    clips = []
+    total_duration = 0
+    skipped_count = 0
+    candidates = iter(candidates)
+    exhausted = False
+    results = {}  # selection index -> extraction result (None when skipped)
+    pending = {}  # future -> (selection index, cancel event, start time, is hedge)
+    running = {}  # selection index -> futures still running for it
+    budgets = {}  # selection index -> (clip duration range, clip count) for the clips at that position
+    seeds = {}  # selection index -> seed for planning the clips of a queued candidate
+    queue = []  # (locality key, selection index, candidate) drawn but not started, sorted by key
+    last_key = None
+    outstanding = {}  # selection index -> longest possible (or, once finished, actual) duration not yet accounted
+    hedged = set()  # selection indices that got a hedge
+    latencies = []  # seconds taken by finished extractions
+    stats = {'extractions': 0, 'hedged': 0, 'hedges_won': 0}
+    budget_error = None
+    # Hedges come from their own stream so they don't shift the seeds drawn after them
+    hedge_rng = random.Random(random.getrandbits(64))
+    next_to_submit = 0
+    next_to_account = 0
+    
+    def draw_candidate():
+        # Return the next candidate with a known duration, or None when there are none left
+        nonlocal exhausted, skipped_count
+        while not exhausted:
+            candidate = next(candidates, _EXHAUSTED)
+            if candidate is _EXHAUSTED:
+                exhausted = True
+            elif candidate[1] is None:
+                print(f"Skipping {candidate[0]}: Could not determine video duration")
+                skipped_count += 1
+            else:
+                return candidate
+        return None
+    
+    def launch(index, candidate, seed, is_hedge=False):
+        video_path, video_duration, keyframes = candidate
+        clip_duration_range, clip_count = budgets[index]
+        rng = random.Random(seed)
+        cancel = threading.Event()
+        future = executor.submit(get_random_clip, video_path, clip_duration_range, video_duration,
+                                 keyframes, rng, clip_count, cancel)
+        pending[future] = (index, cancel, time.monotonic(), is_hedge)
+        running.setdefault(index, []).append(future)
+        stats['extractions'] += 1
+    
+    def start_queued():
+        # Start the queued extraction at or after the last position on disk, wrapping around
+        nonlocal last_key
+        while queue and len(running) < workers:
+            position = 0
+            if last_key is not None:
+                position = bisect.bisect_left([key for key, _, _ in queue], last_key) % len(queue)
+            last_key, index, candidate = queue.pop(position)
+            launch(index, candidate, seeds.pop(index))
+    
+    def cancel_running(futures):
+        for future in futures:
+            pending[future][1].set()
+            future.cancel()
+    
+    # Hedges may run next to the extractions they race against
+    with ThreadPoolExecutor(max_workers=2 * workers) as executor, \
+            tqdm(total=round(target_duration), desc="Processing videos", unit="s") as pbar:
+        while total_duration < target_duration - BUDGET_TOLERANCE:
+            # Queue more work while it fits in the target even if everything drawn comes out long
+            start_queued()
+            while not exhausted and len(queue) < locality_window:
+                room = target_duration - total_duration - sum(outstanding.values())
+                if room < CLIP_DURATION_RANGE[1] and (outstanding or room <= BUDGET_TOLERANCE):
+                    # The final clip is sized once the clips before it are known
+                    break
+                candidate = draw_candidate()
+                if candidate is None:
+                    break
+                budgets[next_to_submit] = get_clip_budget(room, clips_per_file)
+                clip_duration_range, clip_count = budgets[next_to_submit]
+                seeds[next_to_submit] = random.getrandbits(64)
+                outstanding[next_to_submit] = clip_duration_range[1] * clip_count
+                queue.append((get_locality_key(candidate[0]), next_to_submit, candidate))
+                queue.sort(key=lambda item: item[:2])
+                next_to_submit += 1
+                start_queued()
+            
+            # Account for finished results in selection order
+            while next_to_account in results:
+                extracted = results.pop(next_to_account)
+                outstanding.pop(next_to_account, None)
+                if extracted:
+                    for clip, clip_duration in extracted:
+                        clips.append(clip)
+                        total_duration += clip_duration
+                    pbar.n = min(round(total_duration), pbar.total)
+                    # Update the progress bar description instead of printing
+                    pbar.set_description(f"Processing videos (Added: {len(clips)}, Duration: {total_duration:.1f}s)")
+                else:
+                    skipped_count += 1
+                next_to_account += 1
+            
+            if total_duration >= target_duration - BUDGET_TOLERANCE:
+                break
+            if not pending:
+                if exhausted:
+                    break
+                continue
+            
+            # Hedge extractions that have run longer than most in this run
+            timeout = None
+            if hedge_percentile and len(latencies) >= HEDGE_MIN_SAMPLES:
+                threshold = get_percentile(latencies, hedge_percentile)
+                now = time.monotonic()
+                for future, (index, _, started, is_hedge) in list(pending.items()):
+                    if is_hedge or index in hedged or index in results:
+                        continue
+                    if now - started < threshold:
+                        remaining = started + threshold - now
+                        timeout = remaining if timeout is None else min(timeout, remaining)
+                        continue
+                    candidate = draw_candidate()
+                    if candidate is None:
+                        break
+                    launch(index, candidate, hedge_rng.getrandbits(64), is_hedge=True)
+                    hedged.add(index)
+                    stats['hedged'] += 1
+            
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, cancel, started, is_hedge = pending.pop(future)
+                running[index].remove(future)
+                others = running[index]
+                if not others:
+                    del running[index]
+                if future.cancelled():
+                    continue
+                
+                try:
+                    extracted = future.result()
+                except ScratchBudgetExceeded as e:
+                    budget_error = e
+                    continue
+                if extracted and not cancel.is_set():
+                    latencies.append(time.monotonic() - started)
+                if index in results or cancel.is_set():
+                    # The other extraction for this position already won
+                    if extracted:
+                        remove_temp_files(clip for clip, _ in extracted)
+                    continue
+                if extracted or not others:
+                    results[index] = extracted
+                    outstanding[index] = sum(clip_duration for _, clip_duration in extracted) if extracted else 0
+                    if extracted and is_hedge:
+                        stats['hedges_won'] += 1
+                    cancel_running(others)
             
-        return temp_clip
+            if budget_error is not None:
+                break
+        
+        # Cancel extractions that are no longer needed and drop their clips
+        cancel_running(pending)
+        for future in pending:
+            if not future.cancelled() and future.exception() is None and future.result():
+                remove_temp_files(clip for clip, _ in future.result())
+        for extracted in results.values():
+            if extracted:
+                remove_temp_files(clip for clip, _ in extracted)
+        
+        # Complete the progress bar to show full total
+        if total_duration >= target_duration - BUDGET_TOLERANCE:
+            pbar.n = pbar.total
+            pbar.refresh()
+        
+        # Ensure the progress bar displays completely before continuing
+        time.sleep(1)
+    
+    if budget_error is not None:
+        remove_temp_files(clips)
+        raise ScratchBudgetExceeded(
+            f"{budget_error} after {len(clips)} clips ({total_duration:.1f}s). "
+            f"Increase --scratch-budget, or use --direct-concat or --pipe-concat, which write no temporary clips"
+        )
+    
+    return clips, total_duration, skipped_count, stats
+
+def plan_direct_clips(candidates, target_duration, clips_per_file=1):
+    """Plan random clips in candidate files without extracting them.
+    
+    Used for direct concatenation, where the concat demuxer cuts the clips out
+    of the source files itself. candidates yields (path, duration, keyframes)
+    as for extract_clips() and is only drawn from until the planned durations
+    reach the target, with the final clip sized by get_clip_budget(). Returns
+    a list of (source path, start_time, clip_duration), the total duration
+    and the number of skipped videos.
+    """
+    clips = []
+    total_duration = 0
+    skipped_count = 0
+    
+    for video_path, video_duration, keyframes in candidates:
+        if video_duration is None:
+            print(f"Skipping {video_path}: Could not determine video duration")
+            skipped_count += 1
+            continue
+        
+        rng = random.Random(random.getrandbits(64))
+        clip_duration_range, clip_count = get_clip_budget(target_duration - total_duration, clips_per_file)
+        if video_duration < clip_duration_range[0]:
+            print(f"Skipping {video_path}: Video duration ({video_duration}s) is too short")
+            skipped_count += 1
+            continue
+        
+        if keyframes is None:
+            keyframes = get_keyframe_times(video_path)
+        
+        segments = plan_clips(video_duration, clip_duration_range, clip_count, keyframes, rng)
+        if not segments:
+            print(f"Skipping {video_path}: No keyframe leaves room for a {clip_duration_range[0]:.1f}s clip")
+            skipped_count += 1
+            continue
+        for start_time, clip_duration in segments:
+            clips.append((video_path, start_time, clip_duration))
+            total_duration += clip_duration
+        if total_duration >= target_duration - BUDGET_TOLERANCE:
+            break
+    
+    return clips, total_duration, skipped_count
+
+class Prefetcher:
+    """Stages sparse copies of planned clips' source data in the scratch workspace ahead of extraction."""
+    
+    def __init__(self, ahead=PREFETCH_AHEAD, budget=PREFETCH_BUDGET, workers=PREFETCH_WORKERS):
+        self.ahead = ahead
+        self.budget = budget
+        self.used = 0
+        self.staged = 0
+        self.staged_bytes = 0
+        self.misses = 0
+        self._jobs = {}  # key -> {'state', 'path', 'size', 'done'}
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+    
+    def stage(self, key, video_path, segments):
+        """Start staging the data needed to cut the (start_time, duration) segments, once per key."""
+        with self._condition:
+            if key in self._jobs:
+                return
+            job = {'state': 'queued', 'path': None, 'size': 0, 'done': threading.Event()}
+            self._jobs[key] = job
+        self._executor.submit(self._stage, job, video_path, segments)
+    
+    def _stage(self, job, video_path, segments):
+        try:
+            ranges = get_mp4_byte_ranges(video_path, segments)
+            size = sum(length for _, length in ranges) if ranges else 0
+            with self._condition:
+                # Wait for earlier clips to release their data, but never block an empty stage
+                while job['state'] == 'queued' and self.used and self.used + size > self.budget:
+                    self._condition.wait()
+                if job['state'] != 'queued' or not ranges:
+                    return
+                job['state'] = 'started'
+                job['size'] = size
+                self.used += size
+            
+            workspace = get_scratch_workspace()
+            path = None
+            try:
+                path = workspace.new_file('staged.mp4', size)
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o600)
+                try:
+                    with open(video_path, 'rb') as source:
+                        # A sparse file with the ranges at their original offsets
+                        # reads like the source wherever FFmpeg looks
+                        os.ftruncate(fd, os.fstat(source.fileno()).st_size)
+                        for offset, length in ranges:
+                            source.seek(offset)
+                            while length > 0:
+                                data = source.read(min(length, 1024 * 1024))
+                                if not data:
+                                    raise OSError("File is shorter than its index")
+                                os.pwrite(fd, data, offset)
+                                offset += len(data)
+                                length -= len(data)
+                finally:
+                    os.close(fd)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not stage {video_path}: {str(e)}")
+                if path is not None:
+                    workspace.remove(path)
+                return
+            with self._condition:
+                job['path'] = path
+                self.staged += 1
+                self.staged_bytes += size
+        finally:
+            job['done'].set()
+    
+    def take(self, key):
+        """Return the path of the staged copy for key once it is ready, or None to read the source.
+        
+        Staging that hasn't started yet is cancelled instead of waited for,
+        so a clip never waits on the budget held by clips after it.
+        """
+        with self._condition:
+            job = self._jobs.get(key)
+            if job is not None and job['state'] == 'queued':
+                job['state'] = 'cancelled'
+                self._condition.notify_all()
+                job = None
+        if job is not None:
+            job['done'].wait()
+            if job['path'] is not None:
+                return job['path']
+        with self._condition:
+            self.misses += 1
+        return None
+    
+    def release(self, key):
+        """Delete the staged data for key and let waiting stages proceed."""
+        with self._condition:
+            job = self._jobs.pop(key, None)
+            if job is None:
+                return
+            if job['state'] == 'queued':
+                job['state'] = 'cancelled'
+            self.used -= job['size']
+            self._condition.notify_all()
+        if job['path'] is not None:
+            get_scratch_workspace().remove(job['path'])
+    
+    def close(self):
+        """Cancel staging that hasn't started and delete everything staged."""
+        with self._condition:
+            for job in self._jobs.values():
+                if job['state'] == 'queued':
+                    job['state'] = 'cancelled'
+            self._condition.notify_all()
+        self._executor.shutdown(wait=True)
+        for key in list(self._jobs):
+            self.release(key)
+
+def extract_ts_segment(video_path, start_time, clip_duration, ts_offset, input_path=None):
+    """Extract a segment of a video as MPEG-TS data starting at ts_offset on the output timeline.
+    
+    input_path is read in place of video_path if given, e.g. a staged copy
+    from a Prefetcher. Returns the data and the duration FFmpeg reports, or
+    None on failure.
+    """
+    cmd = [
+        'ffmpeg',
+        '-ss', format_seek_time(start_time),
+        '-t', str(clip_duration),
+        '-i', input_path or video_path,
+        '-c', 'copy',  # Copy streams without re-encoding
+        '-f', 'mpegts',
+        '-output_ts_offset', f"{ts_offset:.6f}",  # Continue where the previous clip ends
+        '-progress', 'pipe:2',  # stdout carries the clip, so report progress on stderr
+        '-nostats',
+        'pipe:1'
+    ]
+    
+    try:
+        result = run_command(cmd, timeout=EXTRACT_TIMEOUT, text=False)
     except Exception as e:
         print(f"Failed to create clip from {video_path}: {str(e)}")
-        if os.path.exists(temp_clip):
-            os.remove(temp_clip)
         return None
+    
+    if result.returncode != 0:
+        print(f"Error creating clip from {video_path}: {result.stderr}")
+        return None
+    if not result.stdout:
+        print(f"Failed to create clip from {video_path}: No output data")
+        return None
+    
+    return result.stdout, parse_progress_duration(result.stderr) or clip_duration
+
+def stream_clips(clips, output_path, workers=EXTRACT_WORKERS, prefetcher=None):
+    """Extract planned clips as MPEG-TS and stream them in order into one concat process.
+    
+    Returns the written clips, their total duration and the number of clips
+    that failed.
+    """
+    cmd = [
+        'ffmpeg',
+        '-loglevel', 'error',
+        '-f', 'mpegts',
+        '-i', 'pipe:0',
+        '-c', 'copy',
+        '-y',
+        output_path
+    ]
+    print(f"Writing output video to {output_path}...")
+    concat = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    # Drain stderr in the background so the process can't block on it
+    concat_stderr = []
+    stderr_reader = threading.Thread(target=lambda: concat_stderr.append(concat.stderr.read()), daemon=True)
+    stderr_reader.start()
+    
+    written = []
+    total_duration = 0
+    failed_count = 0
+    results = {}  # clip index -> extraction result (None on failure)
+    pending = {}  # future -> clip index
+    offsets = {}  # clip index -> offset on the output timeline
+    next_to_submit = 0
+    next_to_write = 0
+    written_end = 0
+    concat_exited = False
+    
+    def extract(index, ts_offset):
+        video_path, start_time, clip_duration = clips[index]
+        if prefetcher is None:
+            return extract_ts_segment(video_path, start_time, clip_duration, ts_offset)
+        try:
+            return extract_ts_segment(video_path, start_time, clip_duration, ts_offset, prefetcher.take(index))
+        finally:
+            prefetcher.release(index)
+    
+    def next_offset():
+        # Follow the last clip that is running or written; a failed clip leaves
+        # a gap only if a later clip was already offset against it
+        for index in range(next_to_submit - 1, next_to_write - 1, -1):
+            if results.get(index, True) is not None:
+                return offsets[index] + clips[index][2]
+        return written_end
+    
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor, \
+                tqdm(total=len(clips), desc="Streaming clips") as pbar:
+            while next_to_write < len(clips):
+                # Feed finished clips to the concat process in order
+                while next_to_write in results:
+                    extracted = results.pop(next_to_write)
+                    offset = offsets.pop(next_to_write)
+                    if extracted:
+                        data, clip_duration = extracted
+                        try:
+                            concat.stdin.write(data)
+                        except BrokenPipeError:
+                            # The concat process exited early; its error is reported below
+                            concat_exited = True
+                            next_to_write = len(clips)
+                            break
+                        written.append(clips[next_to_write])
+                        total_duration += clip_duration
+                        written_end = offset + clips[next_to_write][2]
+                        pbar.set_description(f"Streaming clips (Added: {len(written)}, Duration: {total_duration:.1f}s)")
+                    else:
+                        failed_count += 1
+                    next_to_write += 1
+                    pbar.update(1)
+                if next_to_write >= len(clips):
+                    break
+                
+                # Keep up to `workers` extractions in flight
+                while next_to_submit < len(clips) and len(pending) < workers:
+                    offsets[next_to_submit] = next_offset()
+                    future = executor.submit(extract, next_to_submit, offsets[next_to_submit])
+                    pending[future] = next_to_submit
+                    next_to_submit += 1
+                
+                # Stage the clips after those so their data arrives while these are cut
+                if prefetcher is not None:
+                    for index in range(next_to_submit, min(next_to_submit + prefetcher.ahead, len(clips))):
+                        video_path, start_time, clip_duration = clips[index]
+                        prefetcher.stage(index, video_path, [(start_time, clip_duration)])
+                
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+        
+        try:
+            concat.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = concat.wait()
+        stderr_reader.join()
+    except BaseException:
+        # Don't leave the concat process behind, e.g. on KeyboardInterrupt
+        concat.kill()
+        concat.wait()
+        raise
+    
+    if concat_exited or (written and returncode != 0):
+        print(f"Error during compilation: {b''.join(concat_stderr).decode('utf-8', errors='replace')}")
+        raise ValueError("Failed to compile clips")
+    
+    if not written:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return written, total_duration, failed_count
+    
+    # Verify the output file was created and has content
+    if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+        raise ValueError("Output file is missing or empty")
+    
+    return written, total_duration, failed_count
 
-def compile_clips(clips, target_duration, output_path):
-    """Compile clips into a single video using FFmpeg."""
+def compile_clips(clips, target_duration, output_path, direct=False):
+    """Compile clips into a single video using FFmpeg.
+    
+    With direct set, clips are (source path, start_time, clip_duration) tuples
+    and the concat demuxer reads them straight from the source files using
+    inpoint/outpoint directives, so no temporary clips are written. The source
+    files are of course left in place afterwards.
+    """
     if not clips:
         raise ValueError("No clips to compile")
     
     print(f"\nAttempting to compile {len(clips)} clips...")
     
     # Create a temporary file with the list of clips
-    with open('clips.txt', 'w') as f:
+    clip_list = get_scratch_workspace().new_file('clips.txt')
+    with open(clip_list, 'w') as f:
         for clip in clips:
-            # Escape single quotes in the path and wrap in single quotes
-            escaped_path = clip.replace("'", "'\\''")
+            if direct:
+                clip, start_time, clip_duration = clip
+            # The concat demuxer resolves relative paths against the list's
+            # directory, so write absolute ones; escape single quotes and wrap in them
+            escaped_path = os.path.abspath(clip).replace("'", "'\\''")
             f.write(f"file '{escaped_path}'\n")
+            if direct:
+                f.write(f"inpoint {format_seek_time(start_time)}\n")
+                f.write(f"outpoint {start_time + clip_duration:.4f}\n")
     
     try:
         # Concatenate clips using FFmpeg
@@ -166,14 +2005,14 @@ def compile_clips(clips, target_duration, output_path):
             'ffmpeg',
             '-f', 'concat',
             '-safe', '0',
-            '-i', 'clips.txt',
+            '-i', clip_list,
             '-c', 'copy',
             '-y',
-            shlex.quote(output_path)
+            output_path
         ]
         
         print(f"Writing output video to {output_path}...")
-        result = subprocess.run(' '.join(cmd), shell=True, capture_output=True, text=True)
+        result = run_command(cmd)
         
         if result.returncode != 0:
             print(f"Error during compilation: {result.stderr}")
@@ -189,11 +2028,9 @@ def compile_clips(clips, target_duration, output_path):
         raise
     finally:
         # Clean up temporary files
-        if os.path.exists('clips.txt'):
-            os.remove('clips.txt')
-        for clip in clips:
-            if os.path.exists(clip):
-                os.remove(clip)
+        remove_temp_files([clip_list])
+        if not direct:
+            remove_temp_files(clips)
 
 def extract_date_from_filename(filename):
     """Extract date from filename with format YYYYMMDDHHMMSS_*."""
@@ -210,32 +2047,526 @@ def extract_date_from_filename(filename):
     except ValueError:
         return None
 
-def filter_files_by_date_range(files, start_date=None, end_date=None):
-    """Filter files based on date range extracted from filenames."""
-    filtered_files = []
+def extract_timestamp_from_filename(filename):
+    """Extract the recording timestamp from a filename with format YYYYMMDDHHMMSS_*.
     
-    for file_path in files:
-        file_date = extract_date_from_filename(file_path)
-        
-        if file_date is None:
-            # If we can't extract date, include the file (preserve old behavior)
-            print(f"Warning: Could not extract date from {os.path.basename(file_path)}, including in selection")
-            filtered_files.append(file_path)
+    Falls back to midnight when only the YYYYMMDD part is present.
+    """
+    basename = os.path.basename(filename)
+    for length, fmt in ((14, '%Y%m%d%H%M%S'), (8, '%Y%m%d')):
+        if len(basename) >= length and basename[:length].isdigit():
+            try:
+                return datetime.strptime(basename[:length], fmt)
+            except ValueError:
+                continue
+    return None
+
+def open_catalog(catalog_path):
+    """Open (and create if needed) the SQLite media catalog."""
+    catalog_dir = os.path.dirname(catalog_path)
+    if catalog_dir and not os.path.exists(catalog_dir):
+        os.makedirs(catalog_dir)
+    
+    # The indexer and compile runs may use the catalog at the same time
+    conn = sqlite3.connect(catalog_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS media (
+            path TEXT PRIMARY KEY,
+            root TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime INTEGER NOT NULL,
+            timestamp TEXT,
+            duration REAL,
+            streams TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS media_root_timestamp ON media (root, timestamp)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS directories (
+            path TEXT PRIMARY KEY,
+            root TEXT NOT NULL,
+            mtime INTEGER,
+            subdirs TEXT NOT NULL,
+            files TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS directories_root ON directories (root)")
+    conn.commit()
+    return conn
+
+def load_scan_state(conn, root):
+    """Load the directory listings remembered from the previous scan of root."""
+    return {
+        path: (mtime, json.loads(subdirs), [tuple(f) for f in json.loads(files)])
+        for path, mtime, subdirs, files in conn.execute(
+            "SELECT path, mtime, subdirs, files FROM directories WHERE root = ?", (root,)
+        )
+    }
+
+def save_scan_state(conn, root, scan_state, updated):
+    """Persist the directories whose state changed and drop ones that have disappeared."""
+    conn.executemany(
+        "INSERT OR REPLACE INTO directories (path, root, mtime, subdirs, files) VALUES (?, ?, ?, ?, ?)",
+        (
+            (path, root, scan_state[path][0], json.dumps(scan_state[path][1]), json.dumps(scan_state[path][2]))
+            for path in updated
+        )
+    )
+    stored = [path for (path,) in conn.execute("SELECT path FROM directories WHERE root = ?", (root,))]
+    conn.executemany("DELETE FROM directories WHERE path = ?", ((path,) for path in stored if path not in scan_state))
+
+def sync_catalog(conn, root, full_rescan=False, max_workers=1, prune=None):
+    """Scan the input directory and bring the catalog in line with the files on disk.
+    
+    The scan is incremental: only directories whose mtime changed since the last
+    run are listed again, unless full_rescan is set, and the files of recently
+    modified directories are stat'ed. New files are added, changed
+    files (size or mtime differs) have their probe results cleared so they get
+    probed again, and vanished files are removed. Subtrees skipped by prune are
+    left untouched. Returns the number of added, changed and removed rows.
+    """
+    scan_state = {} if full_rescan else load_scan_state(conn, root)
+    entries, relisted, pruned, updated = scan_mp4_files(root, scan_state, max_workers, prune)
+    print(f"Listed {len(relisted)} of {len(scan_state)} directories")
+    if pruned:
+        print(f"Skipped {len(pruned)} directories outside the date range")
+    
+    known = {
+        path: (size, mtime)
+        for path, size, mtime in conn.execute("SELECT path, size, mtime FROM media WHERE root = ?", (root,))
+    }
+    added = changed = 0
+    
+    for file_path, size, mtime in entries:
+        previous = known.pop(file_path, None)
+        if previous == (size, mtime):
             continue
         
-        # Check if file date is within the specified range
-        include_file = True
+        record_catalog_file(conn, root, file_path, size, mtime)
+        if previous is None:
+            added += 1
+        else:
+            changed += 1
+    
+    # Anything left over is no longer on disk, unless it sits in a pruned subtree
+    removed = [path for path in known if not is_under_any(os.path.dirname(path), pruned, root)]
+    conn.executemany("DELETE FROM media WHERE path = ?", ((path,) for path in removed))
+    save_scan_state(conn, root, scan_state, updated)
+    conn.commit()
+    return added, changed, len(removed)
+
+def record_catalog_file(conn, root, file_path, size, mtime):
+    """Insert or update a catalog row, clearing any probe results from an older version."""
+    timestamp = extract_timestamp_from_filename(file_path)
+    conn.execute(
+        "INSERT OR REPLACE INTO media (path, root, size, mtime, timestamp, duration, streams) "
+        "VALUES (?, ?, ?, ?, ?, NULL, NULL)",
+        (file_path, root, size, mtime, timestamp.isoformat() if timestamp else None)
+    )
+
+def query_catalog(conn, root, start_date=None, end_date=None):
+    """Return a cursor over (path, duration) rows from the catalog within the date range.
+    
+    Files without a parseable filename timestamp are always included, matching
+    is_file_in_date_range(). Duration is None for files not probed yet.
+    """
+    query = "SELECT path, duration FROM media WHERE root = ?"
+    params = [root]
+    if start_date or end_date:
+        conditions = []
+        if start_date:
+            conditions.append("timestamp >= ?")
+            params.append(start_date.isoformat())
+        if end_date:
+            conditions.append("timestamp < ?")
+            params.append((end_date + timedelta(days=1)).isoformat())
+        query += f" AND (timestamp IS NULL OR ({' AND '.join(conditions)}))"
+    query += " ORDER BY path"
+    return conn.execute(query, params)
+
+def record_probe_result(conn, video_path, info, size=None, mtime=None):
+    """Record a file's duration and stream parameters in the catalog.
+    
+    If size and mtime are given the result is only stored when the row still
+    describes that version of the file.
+    """
+    query = "UPDATE media SET duration = ?, streams = ? WHERE path = ?"
+    params = [info['duration'], json.dumps(info['streams']), video_path]
+    if size is not None:
+        query += " AND size = ? AND mtime = ?"
+        params += [size, mtime]
+    conn.execute(query, params)
+
+# inotify(7) event flags
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+INDEX_WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+                    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+INOTIFY_EVENT = struct.Struct('iIII')
+
+def inotify_init():
+    """Create an inotify instance, returning the libc handle and the inotify file descriptor."""
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    if not hasattr(libc, 'inotify_init1'):
+        raise ValueError("The indexer requires Linux inotify support")
+    fd = libc.inotify_init1(os.O_CLOEXEC)
+    if fd < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"inotify_init1 failed: {os.strerror(errno)}")
+    return libc, fd
+
+def inotify_add_watch(libc, fd, path, mask):
+    """Add (or update) an inotify watch on path and return its watch descriptor."""
+    wd = libc.inotify_add_watch(fd, os.fsencode(path), ctypes.c_uint32(mask))
+    if wd < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"inotify_add_watch failed for {path}: {os.strerror(errno)}")
+    return wd
+
+def read_inotify_events(fd):
+    """Read the pending events from an inotify descriptor as (wd, mask, cookie, name) tuples."""
+    data = os.read(fd, 64 * 1024)
+    events = []
+    offset = 0
+    while offset < len(data):
+        wd, mask, cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+        offset += INOTIFY_EVENT.size
+        name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+        offset += length
+        events.append((wd, mask, cookie, name))
+    return events
+
+def run_indexer(input_dir, catalog_path, scan_workers=SCAN_WORKERS, probe_workers=PROBE_WORKERS,
+                rescan_interval=INDEX_RESCAN_INTERVAL):
+    """Keep the catalog in sync with the input directory until interrupted.
+    
+    Watches the whole tree with inotify, records new, changed, moved and
+    deleted MP4 files as they happen and probes them in the background, so
+    compile runs can use the catalog with --no-scan. Local inotify does not see
+    changes made by other hosts on network shares, so the tree is also rescanned
+    incrementally every rescan_interval seconds and whenever events are lost.
+    """
+    root = os.path.abspath(input_dir)
+    conn = open_catalog(catalog_path)
+    libc, fd = inotify_init()
+    watches = {}  # wd -> directory path
+    
+    def watch_tree(directory):
+        for current, _, _ in os.walk(directory):
+            try:
+                watches[inotify_add_watch(libc, fd, current, INDEX_WATCH_MASK)] = current
+            except OSError as e:
+                print(f"Warning: Could not watch {current}: {e}")
+    
+    def unwatch_tree(directory):
+        for wd, path in list(watches.items()):
+            if path == directory or path.startswith(directory + os.sep):
+                libc.inotify_rm_watch(fd, wd)
+                del watches[wd]
+    
+    def record_file(file_path):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return
+        record_catalog_file(conn, root, file_path, stat.st_size, stat.st_mtime_ns)
+        to_probe[file_path] = (stat.st_size, stat.st_mtime_ns)
+        print(f"Indexed {file_path}")
+    
+    def forget_tree(directory):
+        prefix = directory + os.sep
+        conn.execute("DELETE FROM media WHERE root = ? AND substr(path, 1, ?) = ?", (root, len(prefix), prefix))
+        unwatch_tree(directory)
+    
+    def rescan():
+        added, changed, removed = sync_catalog(conn, root, max_workers=scan_workers)
+        print(f"Catalog updated: {added} added, {changed} changed, {removed} removed")
+        for file_path, size, mtime in conn.execute(
+            "SELECT path, size, mtime FROM media WHERE root = ? AND duration IS NULL", (root,)
+        ):
+            to_probe[file_path] = (size, mtime)
+    
+    to_probe = {}  # path -> (size, mtime) of the version waiting to be probed
+    probing = {}  # future -> (path, size, mtime)
+    
+    # Watch before the initial scan so nothing landing in between is missed
+    print(f"Watching {input_dir} and indexing into {catalog_path}...")
+    watch_tree(root)
+    rescan()
+    last_rescan = time.monotonic()
+    
+    with ThreadPoolExecutor(max_workers=probe_workers) as executor:
+        try:
+            while True:
+                # Keep the probe workers busy with the files waiting to be probed
+                while to_probe and len(probing) < probe_workers:
+                    file_path, (size, mtime) = to_probe.popitem()
+                    probing[executor.submit(probe_video, file_path)] = (file_path, size, mtime)
+                
+                timeout = 0.5 if probing else max(0.0, rescan_interval - (time.monotonic() - last_rescan))
+                readable, _, _ = select.select([fd], [], [], timeout)
+                
+                if readable:
+                    for wd, mask, _, name in read_inotify_events(fd):
+                        if mask & IN_Q_OVERFLOW:
+                            print("Warning: inotify queue overflowed, rescanning")
+                            last_rescan = 0
+                            continue
+                        if mask & IN_IGNORED:
+                            watches.pop(wd, None)
+                            continue
+                        directory = watches.get(wd)
+                        if directory is None or not name:
+                            continue
+                        path = os.path.join(directory, name)
+                        
+                        if mask & IN_ISDIR:
+                            if mask & (IN_CREATE | IN_MOVED_TO):
+                                # Files may already be inside a directory that was moved in
+                                watch_tree(path)
+                                for current, _, files in os.walk(path):
+                                    for f in files:
+                                        if f.lower().endswith('.mp4'):
+                                            record_file(os.path.join(current, f))
+                            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                                forget_tree(path)
+                        elif name.lower().endswith('.mp4'):
+                            if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                                record_file(path)
+                            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                                conn.execute("DELETE FROM media WHERE path = ?", (path,))
+                                to_probe.pop(path, None)
+                                print(f"Removed {path}")
+                
+                for future in [future for future in probing if future.done()]:
+                    file_path, size, mtime = probing.pop(future)
+                    info = future.result()
+                    if info is not None:
+                        # Only store the result if the file hasn't changed since it was submitted
+                        record_probe_result(conn, file_path, info, size, mtime)
+                
+                conn.commit()
+                
+                if time.monotonic() - last_rescan >= rescan_interval:
+                    rescan()
+                    last_rescan = time.monotonic()
+        finally:
+            for future in probing:
+                future.cancel()
+            conn.commit()
+            conn.close()
+            os.close(fd)
+
+def is_file_in_date_range(file_path, start_date=None, end_date=None):
+    """Check whether the date in a filename lies within the date range."""
+    file_date = extract_date_from_filename(file_path)
+    
+    if file_date is None:
+        # If we can't extract date, include the file (preserve old behavior)
+        print(f"Warning: Could not extract date from {os.path.basename(file_path)}, including in selection")
+        return True
+    
+    # Check if file date is within the specified range
+    if start_date and file_date < start_date:
+        return False
+    
+    if end_date and file_date > end_date:
+        return False
+    
+    return True
+
+@lru_cache(maxsize=4096)
+def is_valid_date_key(date_key):
+    """Check whether a YYYYMMDD integer is a real calendar date."""
+    try:
+        date(date_key // 10000, date_key // 100 % 100, date_key % 100)
+        return True
+    except ValueError:
+        return False
+
+def get_timestamp_key(filename):
+    """Return the filename timestamp as a sortable YYYYMMDDHHMMSS integer, or None.
+    
+    Accepts the same names as extract_timestamp_from_filename() but avoids
+    strptime, which matters when indexing millions of files.
+    """
+    basename = os.path.basename(filename)
+    prefix = basename[:14]
+    if len(prefix) == 14 and prefix.isdigit():
+        key = int(prefix)
+        clock = key % 1_000_000
+        if clock < 240000 and clock // 100 % 100 < 60 and clock % 100 < 60 and is_valid_date_key(key // 1_000_000):
+            return key
+    prefix = basename[:8]
+    if len(prefix) == 8 and prefix.isdigit() and is_valid_date_key(int(prefix)):
+        return int(prefix) * 1_000_000
+    return None
+
+class MediaLibrary:
+    """Compact in-memory table of candidate files for large libraries.
+    
+    Paths are split into an interned directory table plus one byte string of
+    basenames addressed by offsets, and timestamps and durations are packed into
+    arrays, so each file costs a few dozen bytes instead of a full path string
+    and tuple. Files are addressed by integer index; date filtering and
+    sampling work on index arrays and only the chosen paths are rebuilt.
+    """
+    __slots__ = ('directories', 'directory_index', 'directory_ids', 'names', 'name_offsets',
+                 'timestamps', 'durations', '_sorted_indices', '_sorted_timestamps', '_undated')
+    
+    def __init__(self):
+        self.directories = []
+        self.directory_index = {}
+        self.directory_ids = array('I')
+        self.names = bytearray()
+        self.name_offsets = array('Q', [0])
+        self.timestamps = array('q')  # YYYYMMDDHHMMSS keys, -1 when the name has no timestamp
+        self.durations = array('d')  # seconds, NaN when not known
+        self._sorted_indices = None
+    
+    def __len__(self):
+        return len(self.directory_ids)
+    
+    def add(self, path, duration=None):
+        """Append a file with an optional known duration."""
+        directory, name = os.path.split(path)
+        directory_id = self.directory_index.get(directory)
+        if directory_id is None:
+            directory_id = self.directory_index[directory] = len(self.directories)
+            self.directories.append(directory)
         
-        if start_date and file_date < start_date:
-            include_file = False
+        self.directory_ids.append(directory_id)
+        self.names += os.fsencode(name)
+        self.name_offsets.append(len(self.names))
+        key = get_timestamp_key(name)
+        self.timestamps.append(-1 if key is None else key)
+        self.durations.append(math.nan if duration is None else duration)
+        self._sorted_indices = None
+    
+    def extend(self, entries):
+        """Append (path, duration) entries."""
+        for path, duration in entries:
+            self.add(path, duration)
+    
+    def path(self, i):
+        """Rebuild the full path of file i."""
+        name = os.fsdecode(bytes(self.names[self.name_offsets[i]:self.name_offsets[i + 1]]))
+        return os.path.join(self.directories[self.directory_ids[i]], name)
+    
+    def duration(self, i):
+        """Return the known duration of file i, or None."""
+        duration = self.durations[i]
+        return None if math.isnan(duration) else duration
+    
+    def _build_timestamp_index(self):
+        # Dated files sorted by timestamp (stable, so ties keep scan order) with
+        # their timestamps in a parallel array for binary search
+        dated = [i for i in range(len(self)) if self.timestamps[i] >= 0]
+        dated.sort(key=self.timestamps.__getitem__)
+        self._sorted_indices = array('I', dated)
+        self._sorted_timestamps = array('q', (self.timestamps[i] for i in dated))
+        self._undated = array('I', (i for i in range(len(self)) if self.timestamps[i] < 0))
+    
+    def select_date_range(self, start_date=None, end_date=None):
+        """Return the indices of files within the date range using two binary searches.
         
-        if end_date and file_date > end_date:
-            include_file = False
+        Files without a timestamp are always included, like is_file_in_date_range().
+        """
+        if self._sorted_indices is None:
+            self._build_timestamp_index()
         
-        if include_file:
-            filtered_files.append(file_path)
+        lo = 0
+        hi = len(self._sorted_timestamps)
+        if start_date:
+            lo = bisect.bisect_left(self._sorted_timestamps, int(start_date.strftime('%Y%m%d')) * 1_000_000)
+        if end_date:
+            hi = bisect.bisect_left(self._sorted_timestamps, int((end_date + timedelta(days=1)).strftime('%Y%m%d')) * 1_000_000)
+        
+        for i in self._undated:
+            print(f"Warning: Could not extract date from {os.path.basename(self.path(i))}, including in selection")
+        return self._sorted_indices[lo:max(lo, hi)] + self._undated
+
+    def short_fraction(self, indices, min_duration, sample_size=10_000):
+        """Estimate the fraction of files among indices that are known to be shorter than min_duration.
+        
+        Looks at a random sample of up to sample_size files; files without a
+        known duration don't count either way.
+        """
+        sample = random.sample(range(len(indices)), min(sample_size, len(indices)))
+        known = [self.durations[indices[i]] for i in sample if not math.isnan(self.durations[indices[i]])]
+        if not known:
+            return 0.0
+        return sum(1 for duration in known if duration < min_duration) / len(known)
+
+_EXHAUSTED = object()
+
+def iter_shuffled(items, rng=random):
+    """Yield the items of a sequence in random order, shuffling lazily.
+    
+    Runs a Fisher-Yates shuffle one step per item drawn, remembering only the
+    swapped positions, so drawing a few items from a large sequence is cheap
+    and the sequence itself is never copied.
+    """
+    n = len(items)
+    swapped = {}
+    for i in range(n):
+        j = rng.randrange(i, n)
+        yield swapped.get(j, items[j])
+        swapped[j] = swapped.pop(i, items[i])
+
+def reservoir_sample(items, k):
+    """Uniformly sample up to k items from an iterable of unknown length in one pass.
     
-    return filtered_files
+    Uses reservoir sampling (Li's Algorithm L), so only k items are kept in
+    memory and most items are skipped without drawing a random number. Like
+    random.sample(), the sample is returned in random order. Returns the sample
+    and the total number of items seen.
+    """
+    iterator = iter(items)
+    reservoir = list(islice(iterator, k))
+    seen = len(reservoir)
+    
+    if k > 0 and seen == k:
+        # random.random() can return 0.0, so use 1 - random() which lies in (0, 1]
+        w = math.exp(math.log(1.0 - random.random()) / k)
+        while w < 1.0:
+            # Number of items to pass over before the next replacement
+            skip = math.floor(math.log(1.0 - random.random()) / math.log1p(-w))
+            consumed = sum(1 for _ in islice(iterator, skip))
+            seen += consumed
+            if consumed < skip:
+                break
+            item = next(iterator, _EXHAUSTED)
+            if item is _EXHAUSTED:
+                break
+            seen += 1
+            reservoir[random.randrange(k)] = item
+            w *= math.exp(math.log(1.0 - random.random()) / k)
+        else:
+            seen += sum(1 for _ in iterator)
+    else:
+        seen += sum(1 for _ in iterator)
+    
+    random.shuffle(reservoir)
+    return reservoir, seen
+
+def estimate_files_needed(target_duration, skip_rate=0.0):
+    """Estimate how many files must be drawn to reach the target duration.
+    
+    skip_rate is the expected fraction of files that yield no clip.
+    """
+    avg_clip_duration = (CLIP_DURATION_RANGE[0] + CLIP_DURATION_RANGE[1]) / 2
+    return int(target_duration / avg_clip_duration / (1 - min(skip_rate, 0.9))) + 1
 
 def parse_date_input(date_str):
     """Parse date input in various formats (YYYY-MM-DD, YYYY-MM, YYYYMMDD)."""
@@ -267,85 +2598,159 @@ def parse_date_input(date_str):
     except ValueError as e:
         raise ValueError(f"Invalid date format. Use YYYY-MM-DD, YYYY-MM, YYYYMMDD, or YYYYMM. Error: {e}")
 
-def main(input_dir, target_duration, output_filename, start_date=None, end_date=None):
+def main(input_dir, target_duration, output_filename, start_date=None, end_date=None,
+         catalog_path=None, rescan=False, scan_workers=SCAN_WORKERS,
+         dir_date_patterns=DIRECTORY_DATE_PATTERNS, streaming=False, scan=True, manifest_path=None,
+         probe_workers=PROBE_WORKERS, extract_workers=EXTRACT_WORKERS, direct_concat=False,
+         pipe_concat=False, hedge_percentile=HEDGE_PERCENTILE, locality_window=LOCALITY_WINDOW,
+         prefetch_ahead=PREFETCH_AHEAD, prefetch_budget=PREFETCH_BUDGET):
     # Ensure output directory exists
     if not os.path.exists(OUTPUT_DIR):
         os.makedirs(OUTPUT_DIR)
     
-    # Get list of MP4 files
-    mp4_files = get_mp4_files(input_dir)
-    print(f"\nFound {len(mp4_files)} MP4 files in {input_dir}")
+    # Skip date-partitioned subdirectories that can't contain matching files
+    prune = None
+    if input_dir:
+        prune = make_directory_pruner(os.path.abspath(input_dir), start_date, end_date, dir_date_patterns)
     
-    # Filter files by date range if specified
-    if start_date or end_date:
+    # Estimate how many files are needed to reach the target duration
+    estimated_files_needed = estimate_files_needed(target_duration)
+    
+    # Collect candidate (path, duration) entries from the manifest, the catalog or a scan
+    conn = None
+    filter_by_date = bool(start_date or end_date)
+    if manifest_path:
+        # Read the candidates straight from the manifest without touching the tree
+        print(f"\nReading manifest {manifest_path}...")
+        source = "the manifest"
+        entries = read_manifest(manifest_path)
+    elif catalog_path:
+        # Query the persistent catalog instead of walking and probing every run
+        conn = open_catalog(catalog_path)
+        root = os.path.abspath(input_dir)
+        if scan:
+            print(f"\nScanning {input_dir} to update catalog {catalog_path}...")
+            added, changed, removed = sync_catalog(conn, root, full_rescan=rescan, max_workers=scan_workers, prune=prune)
+            print(f"Catalog updated: {added} added, {changed} changed, {removed} removed")
+        source = f"the catalog for {input_dir}"
+        # The catalog query already applies the date range
+        entries = query_catalog(conn, root, start_date, end_date)
+        filter_by_date = False
+    else:
+        source = input_dir
+        entries = ((path, None) for path in get_mp4_files(input_dir, scan_workers, prune))
+    
+    def print_date_range():
         print(f"Filtering files by date range...")
         if start_date:
             print(f"Start date: {start_date}")
         if end_date:
             print(f"End date: {end_date}")
+    
+    if streaming:
+        # Sample while reading so only the sampled files are ever held in memory,
+        # keeping spares to draw from when files are skipped
+        if start_date or end_date:
+            print_date_range()
+        if filter_by_date:
+            entries = (entry for entry in entries if is_file_in_date_range(entry[0], start_date, end_date))
+        sampled_entries, matched_count = reservoir_sample(entries, estimated_files_needed * STREAMING_SAMPLE_FACTOR)
+        print(f"\nSampled {len(sampled_entries)} of {matched_count} matching MP4 files in {source}")
+        pool_size = len(sampled_entries)
+        candidates = iter(sampled_entries)
+    else:
+        library = MediaLibrary()
+        library.extend(entries)
+        print(f"\nFound {len(library)} MP4 files in {source}")
+        if start_date or end_date:
+            print_date_range()
         
-        mp4_files = filter_files_by_date_range(mp4_files, start_date, end_date)
-        print(f"After date filtering: {len(mp4_files)} files remain")
+        # Filter files by date range if specified
+        if filter_by_date:
+            indices = library.select_date_range(start_date, end_date)
+            print(f"After date filtering: {len(indices)} files remain")
+        else:
+            indices = range(len(library))
+        
+        # Files already known to be too short will be skipped, so more are needed
+        skip_rate = library.short_fraction(indices, CLIP_DURATION_RANGE[0])
+        estimated_files_needed = estimate_files_needed(target_duration, skip_rate)
         
-        if not mp4_files:
+        # Draw files in random order, only as many as turn out to be needed
+        pool_size = len(indices)
+        candidates = ((library.path(i), library.duration(i)) for i in iter_shuffled(indices))
+    
+    if not pool_size:
+        if start_date or end_date:
             raise ValueError("No files match the specified date range")
+        raise ValueError(f"No MP4 files found in {source}")
     
-    # Estimate how many clips are needed to reach the target duration
-    avg_clip_duration = (CLIP_DURATION_RANGE[0] + CLIP_DURATION_RANGE[1]) / 2
-    estimated_clips_needed = int(target_duration / avg_clip_duration) + 1
+    # Take several clips from each file when there are fewer files than clips needed
+    clips_per_file = max(1, math.ceil(estimated_files_needed / pool_size))
     
-    # Randomly select files (ensure we don't select more than available)
-    num_files_to_select = min(estimated_clips_needed, len(mp4_files))
-    selected_files = random.sample(mp4_files, num_files_to_select)
+    def record_probe(video_path, info):
+        if conn is not None:
+            record_probe_result(conn, video_path, info)
     
-    # Extract random clips from selected files with a progress bar
-    clips = []
-    total_duration = 0
-    skipped_count = 0
-    print(f"Attempting to extract clips from {len(selected_files)} videos...")
-    
-    # Use a manual progress bar for better control
-    total_files = len(selected_files)
-    
-    with tqdm(total=total_files, desc="Processing videos") as pbar:
-        for i, video_path in enumerate(selected_files):
-            clip = get_random_clip(video_path, CLIP_DURATION_RANGE)
-            if clip:
-                clips.append(clip)
-                clip_duration = get_video_duration(clip)
-                if clip_duration:
-                    total_duration += clip_duration
-                    # Update the progress bar description instead of printing
-                    pbar.set_description(f"Processing videos (Added: {len(clips)}, Duration: {total_duration:.1f}s)")
-            else:
-                skipped_count += 1
-            
-            # Update progress bar
-            pbar.update(1)
-            
-            # Stop adding clips if we've exceeded the target duration
-            if total_duration >= target_duration:
-                # Complete the progress bar to show full total
-                remaining_files = total_files - (i + 1)
-                if remaining_files > 0:
-                    pbar.update(remaining_files)
-                break
-        
-        # Ensure the progress bar displays completely before continuing
-        import time
-        time.sleep(1)
+    # Probe files with unknown durations in the background as they are drawn
+    candidates = probe_candidates(candidates, probe_workers, record_probe)
+    
+    output_path = os.path.join(OUTPUT_DIR, output_filename)
+    hedge_stats = None
+    prefetcher = None
+    if direct_concat:
+        # Let the final FFmpeg pass cut the clips straight from the sources
+        print(f"Planning clips from up to {pool_size} videos...")
+        clips, total_duration, skipped_count = plan_direct_clips(candidates, target_duration, clips_per_file)
+    elif pipe_concat:
+        # Compile while extracting by piping the clips into a single concat process
+        print(f"Planning clips from up to {pool_size} videos...")
+        planned_clips, _, skipped_count = plan_direct_clips(candidates, target_duration, clips_per_file)
+        if prefetch_ahead:
+            # Stage upcoming clips' source data locally while the current ones are cut
+            prefetcher = Prefetcher(prefetch_ahead, prefetch_budget)
+        try:
+            clips, total_duration, failed_count = stream_clips(planned_clips, output_path, extract_workers, prefetcher)
+        finally:
+            if prefetcher is not None:
+                prefetcher.close()
+        skipped_count += failed_count
+    else:
+        # Extract random clips from candidate files with a progress bar
+        print(f"Attempting to extract clips from up to {pool_size} videos...")
+        clips, total_duration, skipped_count, hedge_stats = extract_clips(
+            candidates, target_duration, extract_workers, clips_per_file, hedge_percentile, locality_window
+        )
+    candidates.close()
+    if conn is not None:
+        conn.commit()
     
     print(f"\nProcessing complete:")
     print(f"- Successfully created {len(clips)} clips")
     print(f"- Skipped {skipped_count} videos")
     print(f"- Total duration: {total_duration:.1f}s (target: {target_duration}s)")
+    if hedge_stats and hedge_stats['extractions']:
+        hedge_rate = hedge_stats['hedged'] / hedge_stats['extractions'] * 100
+        print(f"- Hedged {hedge_stats['hedged']} of {hedge_stats['extractions']} extractions ({hedge_rate:.1f}%), "
+              f"{hedge_stats['hedges_won']} hedges finished first")
+    if prefetcher is not None:
+        print(f"- Prefetched {prefetcher.staged} clips ({prefetcher.staged_bytes / (1024 * 1024):.1f} MB), "
+              f"{prefetcher.misses} read from the source")
+    if probe_cache:
+        print(f"- Probe cache: {probe_cache.hits} hits, {probe_cache.misses} misses")
+    
+    if conn is not None:
+        conn.close()
     
     if not clips:
         raise ValueError("No valid clips were generated. Check your input videos.")
     
+    if pipe_concat:
+        print(f"Successfully compiled video saved to {output_path}")
+        return
+    
     # Compile the clips into a single video
-    output_path = os.path.join(OUTPUT_DIR, output_filename)
-    compile_clips(clips, target_duration, output_path)
+    compile_clips(clips, target_duration, output_path, direct=direct_concat)
 
 def parse_arguments():
     """Parse command-line arguments and prompt for missing values."""
@@ -365,6 +2770,12 @@ def parse_arguments():
         type=str,
         help="Input directory containing MP4 files"
     )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        help="File listing the videos to choose from (one path per line, or JSON lines with path/size/mtime/duration) "
+             "instead of scanning an input directory"
+    )
     parser.add_argument(
         "--start-date",
         type=str,
@@ -380,9 +2791,169 @@ def parse_arguments():
         type=str,
         help="Filter for specific month (format: YYYY-MM or YYYYMM). Overrides start-date and end-date."
     )
+    parser.add_argument(
+        "--dir-date-pattern",
+        type=str,
+        action="append",
+        dest="dir_date_patterns",
+        help="Regular expression with year/month/day named groups matching date-named directories "
+             "(relative to the input directory, using '/'). Repeat for several patterns; replaces the built-in ones"
+    )
+    parser.add_argument(
+        "--no-dir-pruning",
+        action="store_true",
+        help="Scan every directory even when a date range is given"
+    )
+    parser.add_argument(
+        "--probe-workers",
+        type=int,
+        default=PROBE_WORKERS,
+        help=f"Number of videos probed concurrently (default: {PROBE_WORKERS})"
+    )
+    parser.add_argument(
+        "--no-probe-cache",
+        action="store_true",
+        help="Don't use the persistent probe result cache in the user cache directory"
+    )
+    parser.add_argument(
+        "--extract-workers",
+        type=int,
+        default=EXTRACT_WORKERS,
+        help=f"Number of clips extracted concurrently (default: {EXTRACT_WORKERS})"
+    )
+    parser.add_argument(
+        "--locality-window",
+        type=int,
+        default=LOCALITY_WINDOW,
+        help=f"Number of candidates drawn ahead so extractions run in on-disk order, 1 for draw order (default: {LOCALITY_WINDOW})"
+    )
+    parser.add_argument(
+        "--hedge-percentile",
+        type=float,
+        default=HEDGE_PERCENTILE,
+        help=f"Start a replacement for extractions slower than this percentile of the run so far, 0 to disable (default: {HEDGE_PERCENTILE})"
+    )
+    parser.add_argument(
+        "--direct-concat",
+        action="store_true",
+        help="Cut the clips straight from the source files while compiling instead of extracting temporary clips"
+    )
+    parser.add_argument(
+        "--pipe-concat",
+        action="store_true",
+        help="Stream the clips as MPEG-TS into a single FFmpeg process that writes the output while extracting"
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=PREFETCH_AHEAD,
+        help=f"With --pipe-concat, number of upcoming clips whose source data is staged in the scratch workspace "
+             f"while the current ones are extracted, 0 to disable (default: {PREFETCH_AHEAD})"
+    )
+    parser.add_argument(
+        "--prefetch-budget",
+        type=int,
+        default=PREFETCH_BUDGET // (1024 * 1024),
+        help=f"Maximum size of the staged source data in MB (default: {PREFETCH_BUDGET // (1024 * 1024)})"
+    )
+    parser.add_argument(
+        "--scratch-dir",
+        default=SCRATCH_DIR,
+        help="Directory for the per-run scratch workspace holding temporary clips, ideally on tmpfs or local SSD, "
+             "or 'memfd' to keep them in memory (default: the system temp directory)"
+    )
+    parser.add_argument(
+        "--scratch-budget",
+        type=int,
+        default=SCRATCH_BUDGET // (1024 * 1024),
+        help=f"Maximum size of the temporary files in the scratch workspace in MB (default: {SCRATCH_BUDGET // (1024 * 1024)})"
+    )
+    parser.add_argument(
+        "--max-processes",
+        type=int,
+        default=MAX_PROCESSES,
+        help=f"Maximum number of FFmpeg/FFprobe processes running at once (default: {MAX_PROCESSES})"
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Select files with reservoir sampling while scanning instead of building the full file list"
+    )
+    parser.add_argument(
+        "--catalog",
+        type=str,
+        nargs="?",
+        const=CATALOG_PATH,
+        help=f"Use a persistent SQLite media catalog instead of scanning and probing every run (default path: {CATALOG_PATH})"
+    )
+    parser.add_argument(
+        "--scan-workers",
+        type=int,
+        default=SCAN_WORKERS,
+        help=f"Number of directories to list concurrently while scanning (default: {SCAN_WORKERS})"
+    )
+    parser.add_argument(
+        "--no-scan",
+        action="store_true",
+        help="Use the catalog as is without scanning the input directory (e.g. while the indexer is running)"
+    )
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help="Run the indexer: watch the input directory and keep the catalog up to date until interrupted"
+    )
+    parser.add_argument(
+        "--rescan",
+        action="store_true",
+        help="Re-list every directory when refreshing the catalog instead of only the ones that changed"
+    )
     
     args = parser.parse_args()
     
+    if args.scan_workers < 1:
+        print("Invalid scan workers: must be at least 1")
+        exit(1)
+    
+    if args.probe_workers < 1:
+        print("Invalid probe workers: must be at least 1")
+        exit(1)
+    
+    if args.extract_workers < 1:
+        print("Invalid extract workers: must be at least 1")
+        exit(1)
+    
+    if args.locality_window < 1:
+        print("Invalid locality window: must be at least 1")
+        exit(1)
+    
+    if not 0 <= args.hedge_percentile <= 100:
+        print("Invalid hedge percentile: must be between 0 and 100")
+        exit(1)
+    
+    if args.direct_concat and args.pipe_concat:
+        print("Invalid options: --direct-concat and --pipe-concat can't be used together")
+        exit(1)
+    
+    if args.scratch_budget < 1:
+        print("Invalid scratch budget: must be at least 1 MB")
+        exit(1)
+    
+    if args.prefetch < 0:
+        print("Invalid prefetch: must be at least 0")
+        exit(1)
+    
+    if args.prefetch and not args.pipe_concat:
+        print("Invalid options: --prefetch requires --pipe-concat")
+        exit(1)
+    
+    if args.prefetch_budget < 1:
+        print("Invalid prefetch budget: must be at least 1 MB")
+        exit(1)
+    
+    if args.max_processes < 1:
+        print("Invalid max processes: must be at least 1")
+        exit(1)
+    
     # Handle month filtering (convenience option)
     if args.month:
         try:
@@ -419,14 +2990,34 @@ def parse_arguments():
             print(f"Invalid end date: {e}")
             exit(1)
     
+    if args.no_dir_pruning:
+        args.dir_date_patterns = []
+    elif args.dir_date_patterns is None:
+        args.dir_date_patterns = DIRECTORY_DATE_PATTERNS
+    for pattern in args.dir_date_patterns:
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            print(f"Invalid directory date pattern {pattern!r}: {e}")
+            exit(1)
+    
+    if args.manifest and not os.path.isfile(args.manifest):
+        print(f"Manifest not found: {args.manifest}")
+        exit(1)
+    
     # Prompt for missing values
-    if args.input_dir is None:
+    if args.input_dir is None and not args.manifest:
         args.input_dir = get_user_input(
             "Enter the input directory path",
             default=INPUT_DIR,
             validator=validate_directory
         )
     
+    if args.index:
+        # The indexer only needs the input directory and the catalog
+        args.catalog = args.catalog or CATALOG_PATH
+        return args
+    
     if args.duration is None:
         args.duration = get_user_input(
             "Enter the target duration in seconds",
@@ -455,17 +3046,41 @@ if __name__ == "__main__":
         # Parse command-line arguments and get user input
         args = parse_arguments()
         
+        set_max_processes(args.max_processes)
+        if not args.no_probe_cache:
+            open_probe_cache()
+        
+        if args.index:
+            run_indexer(args.input_dir, args.catalog, scan_workers=args.scan_workers, probe_workers=args.probe_workers)
+            exit(0)
+        
+        # Turn SIGTERM into a normal exit so the scratch workspace is still cleaned up
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+        open_scratch_workspace(args.scratch_dir, args.scratch_budget * 1024 * 1024)
+        
         print(f"\nUsing the following settings:")
-        print(f"Input directory: {args.input_dir}")
+        if args.manifest:
+            print(f"Manifest: {args.manifest}")
+        else:
+            print(f"Input directory: {args.input_dir}")
         print(f"Target duration: {args.duration} seconds")
         print(f"Output filename: {args.output}")
         if args.start_date_parsed:
             print(f"Start date: {args.start_date_parsed}")
         if args.end_date_parsed:
             print(f"End date: {args.end_date_parsed}")
+        if args.catalog:
+            print(f"Catalog: {args.catalog}")
         print()
         
-        main(args.input_dir, args.duration, args.output, args.start_date_parsed, args.end_date_parsed)
+        main(args.input_dir, args.duration, args.output, args.start_date_parsed, args.end_date_parsed,
+             catalog_path=args.catalog, rescan=args.rescan, scan_workers=args.scan_workers,
+             dir_date_patterns=args.dir_date_patterns, streaming=args.streaming, scan=not args.no_scan,
+             manifest_path=args.manifest, probe_workers=args.probe_workers,
+             extract_workers=args.extract_workers, direct_concat=args.direct_concat,
+             pipe_concat=args.pipe_concat, hedge_percentile=args.hedge_percentile,
+             locality_window=args.locality_window, prefetch_ahead=args.prefetch,
+             prefetch_budget=args.prefetch_budget * 1024 * 1024)
     except Exception as e:
         print(f"An error occurred: {e}")
     except KeyboardInterrupt: